@@ -12,7 +12,8 @@ Startup sequence
 5. Expose REST endpoints: /detect, /logs, /health, /dashboard, /api/*.
 
 Run with:
-    python app.py
+    python app.py           # development server
+    ./run.sh                # gunicorn (1 worker × 8 threads) for production
 """
 
 import os
@@ -22,24 +23,36 @@ import sys
 from dotenv import load_dotenv
 load_dotenv()  # Load .env file before importing config
 
-import uuid
+import shutil
+import secrets
+import itertools
 import logging
+import threading
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from flask import (
-    Flask, render_template, request,
-    jsonify, send_from_directory,
+    Flask, Request, Response, render_template, request,
+    jsonify, stream_with_context,
 )
+from flask.json.provider import JSONProvider
 from werkzeug.utils import secure_filename
 
+try:
+    import orjson
+except ImportError:  # optional — fall back to Flask's stdlib-json provider
+    orjson = None
+
 # ── Ensure project root is on path ───────────────────────────────────────────
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import config
-from services.detection import run_detection
+from services.batcher    import DynamicBatcher
+from services.detection  import PREDICT_KWARGS
 from services.alert      import check_threat
-from services.logger     import log_detections, get_recent_logs
-from services.analyst    import generate_sitrep, analyst_chat, build_detection_context
+from services.logger     import log_detections, get_recent_logs, iter_csv
 from services.sitrep_store import get_store
 from services.geo_service import extract_gps
 
@@ -52,10 +65,34 @@ logging.basicConfig(
 log = logging.getLogger("app")
 
 # ── Flask app ─────────────────────────────────────────────────────────────────
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (also serialises NumPy values)."""
+
+    _OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self._OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class UploadRequest(Request):
+    """Request that buffers file uploads in memory up to UPLOAD_SPOOL_MAX."""
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=config.UPLOAD_SPOOL_MAX, mode="rb+")
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 app.secret_key              = config.SECRET_KEY
 app.config["UPLOAD_FOLDER"] = config.UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = config.MAX_CONTENT_LENGTH
+app.use_x_sendfile          = config.USE_X_SENDFILE
 
 # ── Directory bootstrap ───────────────────────────────────────────────────────
 for directory in [config.UPLOAD_FOLDER, "logs", "models"]:
@@ -67,75 +104,266 @@ def _load_model():
     Load YOLO model at startup.
     Supports multiple model types: military, dota, coco
     Model selection via MODEL_TYPE environment variable
+    (resolved to a weights file once, in config.RESOLVED_WEIGHTS)
     """
     from ultralytics import YOLO  # imported here so the import error is clear
 
-    model_type = config.MODEL_TYPE
-    
-    # Determine which model to load
-    if model_type == "dota":
-        if os.path.exists(config.DOTA_MODEL_PATH):
-            weights = config.DOTA_MODEL_PATH
-            log.info("Loading DOTA aerial detection model: %s", weights)
-        else:
-            log.warning("DOTA model not found at '%s'. Falling back to COCO.", config.DOTA_MODEL_PATH)
-            weights = config.COCO_MODEL_PATH
-    
-    elif model_type == "military":
-        if os.path.exists(config.MILITARY_MODEL_PATH):
-            weights = config.MILITARY_MODEL_PATH
-            log.info("Loading military detection model: %s", weights)
-        else:
-            log.warning("Military model not found at '%s'. Falling back to COCO.", config.MILITARY_MODEL_PATH)
-            weights = config.COCO_MODEL_PATH
-    
-    elif model_type == "coco":
-        weights = config.COCO_MODEL_PATH
-        log.info("Loading COCO pretrained model: %s", weights)
-    
-    else:  # auto - try to detect best available model
-        if os.path.exists(config.MILITARY_MODEL_PATH):
-            weights = config.MILITARY_MODEL_PATH
-            log.info("Auto-detected military model: %s", weights)
-        elif os.path.exists(config.DOTA_MODEL_PATH):
-            weights = config.DOTA_MODEL_PATH
-            log.info("Auto-detected DOTA model: %s", weights)
-        else:
-            weights = config.COCO_MODEL_PATH
-            log.warning(
-                "No custom models found. "
-                "Falling back to '%s' (COCO pre-trained). "
-                "Train a custom model for better results.",
-                weights,
-            )
-
-    model = YOLO(weights)
-    # Warm-up inference to pre-allocate GPU memory and JIT compile layers
+    weights = config.RESOLVED_WEIGHTS
+    if weights == config.COCO_MODEL_PATH and config.MODEL_TYPE != "coco":
+        log.warning(
+            "No custom model found for MODEL_TYPE=%s. "
+            "Falling back to '%s' (COCO pre-trained). "
+            "Train a custom model for better results.",
+            config.MODEL_TYPE, weights,
+        )
+    else:
+        log.info("Loading %s model: %s", config.MODEL_TYPE, weights)
+
+    import torch
+    cuda = torch.cuda.is_available() and config.DEVICE != "cpu"
+    if cuda:
+        # Input shapes repeat (640px letterbox), so cuDNN autotuning pays off;
+        # TF32 lets FP32 convs/matmuls use tensor cores on Ampere and newer.
+        torch.backends.cudnn.benchmark        = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32       = True
+        torch.set_float32_matmul_precision("high")
+
+    engine_path = _build_trt_engine(weights)
+    onnx_path   = None if engine_path else _build_onnx_model(weights)
+    if engine_path:
+        model = YOLO(engine_path, task="detect")
+        half  = True
+    elif onnx_path:
+        model = YOLO(onnx_path, task="detect")  # served by ONNX Runtime
+        half  = False
+    else:
+        model = YOLO(weights)
+        half  = cuda  # FP16 PyTorch inference halves activation memory/traffic
+
+    # Every later predict() inherits the precision chosen here
+    model.overrides["half"] = half
+
+    # Warm-up at a single image and at the full batch size, a few times, so
+    # cuDNN autotuning and the CUDA caching allocator are settled for both
+    # the idle-server and the fully-batched case before the first request.
     import numpy as np
     dummy = np.zeros((640, 640, 3), dtype=np.uint8)
-    model.predict(source=dummy, verbose=False)
+    for _ in range(3):
+        for batch in sorted({1, config.MAX_BATCH}):
+            model.predict(source=[dummy] * batch, batch=batch, **PREDICT_KWARGS)
     log.info("Model ready ✓  (device: %s)", model.device)
     return model
 
 
+def _build_trt_engine(weights: str):
+    """
+    Export *weights* to an FP16 TensorRT engine cached under models/.
+    Returns the engine path, or None when TensorRT is disabled/unavailable
+    (in which case the caller serves the plain PyTorch weights).
+    """
+    if not config.USE_TRT:
+        return None
+
+    import torch
+    if not torch.cuda.is_available():
+        log.info("CUDA not available — skipping TensorRT export.")
+        return None
+
+    models_dir = os.path.join(config.BASE_DIR, "models")
+    stem       = Path(weights).stem
+
+    # An INT8 engine calibrated by scripts/deploy_dota_model.py wins over FP16
+    int8_path = os.path.join(models_dir, f"{stem}_int8_bs{config.MAX_BATCH}.engine")
+    if not config.TRT_ENGINE_PATH and os.path.exists(int8_path):
+        if _export_is_current(weights, int8_path):
+            log.info("Using INT8 TensorRT engine: %s", int8_path)
+            return int8_path
+        log.warning("INT8 TensorRT engine is older than '%s' — ignoring it "
+                    "(re-run scripts/deploy_dota_model.py to recalibrate)", weights)
+
+    engine_path = config.TRT_ENGINE_PATH or os.path.join(
+        models_dir, f"{stem}_fp16_bs{config.MAX_BATCH}.engine",
+    )
+    return _export_cached(
+        weights, engine_path,
+        format    = "engine",
+        imgsz     = 640,
+        half      = True,
+        dynamic   = True,
+        batch     = config.MAX_BATCH,
+        device    = 0,
+        workspace = 4,
+    )
+
+
+def _build_onnx_model(weights: str):
+    """
+    Export *weights* to a dynamic-batch ONNX model cached under models/.
+    Ultralytics serves it through ONNX Runtime (CUDA provider when available),
+    which needs no per-GPU engine build. Returns None when disabled or failed.
+    """
+    if not config.USE_ONNX:
+        return None
+
+    import torch
+    cuda = torch.cuda.is_available()
+
+    onnx_path = config.ONNX_MODEL_PATH or os.path.join(
+        config.BASE_DIR, "models",
+        f"{Path(weights).stem}_{'fp16' if cuda else 'fp32'}_dynamic.onnx",
+    )
+    return _export_cached(
+        weights, onnx_path,
+        format   = "onnx",
+        imgsz    = 640,
+        half     = cuda,            # FP16 export requires a GPU
+        dynamic  = True,
+        simplify = True,
+        device   = 0 if cuda else "cpu",
+    )
+
+
+def _export_is_current(weights: str, export_path: str) -> bool:
+    """True unless *export_path* is older than *weights* (retraining overwrites them in place)."""
+    return (not os.path.exists(weights)   # e.g. COCO weights fetched on demand
+            or os.path.getmtime(export_path) >= os.path.getmtime(weights))
+
+
+def _export_cached(weights: str, target_path: str, **export_kwargs):
+    """
+    Export *weights* with Ultralytics unless *target_path* already exists and
+    is newer than the weights (retraining overwrites the weights in place).
+    Returns *target_path*, or None if the export failed.
+    """
+    from ultralytics import YOLO
+
+    if os.path.exists(target_path):
+        if _export_is_current(weights, target_path):
+            log.info("Using cached %s export: %s", export_kwargs["format"], target_path)
+            return target_path
+        log.info("Cached %s export is older than '%s' — re-exporting", export_kwargs["format"], weights)
+
+    log.info("Exporting '%s' to %s (one-off, may take 1-2 min) …", weights, export_kwargs["format"])
+    try:
+        exported = YOLO(weights).export(**export_kwargs)
+        # Ultralytics writes the export next to the weights; persist it in models/
+        if os.path.abspath(exported) != os.path.abspath(target_path):
+            os.replace(exported, target_path)
+    except Exception:
+        log.exception("%s export failed — falling back to '%s'", export_kwargs["format"], weights)
+        return None
+
+    log.info("Export saved: %s", target_path)
+    return target_path
+
+
 log.info("Loading YOLO model — this may take a moment …")
 MODEL = _load_model()
+BATCHER = DynamicBatcher(
+    MODEL,
+    max_batch   = config.MAX_BATCH,
+    max_wait_ms = config.BATCH_MAX_WAIT_MS,
+)
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 def _allowed_file(filename: str) -> bool:
-    return (
-        "." in filename
-        and filename.rsplit(".", 1)[1].lower() in config.ALLOWED_EXTENSIONS
-    )
+    _, dot, ext = filename.rpartition(".")
+    return bool(dot) and ext.lower() in config.ALLOWED_EXTENSIONS
+
+
+# Upload ids: one random per-process prefix plus a counter, so the hot path
+# needs no urandom read. The prefix keeps ids unique across restarts (scan ids
+# derived from them are persisted in the SITREP store).
+_UPLOAD_PREFIX  = secrets.token_hex(4)
+_UPLOAD_COUNTER = itertools.count()
 
 
 def _unique_filename(filename: str) -> str:
-    """Prefix with a UUID to avoid collisions and path-traversal issues."""
-    stem = Path(secure_filename(filename)).stem[:40]  # truncate long names
-    ext  = Path(secure_filename(filename)).suffix
-    return f"{uuid.uuid4().hex[:8]}_{stem}{ext}"
+    """Prefix with a unique id to avoid collisions and path-traversal issues."""
+    safe = Path(secure_filename(filename))
+    stem = safe.stem[:40]  # truncate long names
+    return f"{_UPLOAD_PREFIX}{next(_UPLOAD_COUNTER):06x}_{stem}{safe.suffix}"
+
+
+_UPLOAD_CHUNK = 1 << 20  # 1 MiB
+
+# Post-detection work (CSV log, SITREP) runs off the request thread.
+# _SITREP_STATUS tracks scans whose SITREP is still pending or has failed;
+# failures are dropped once polled, or once _SITREP_STATUS_MAX newer scans
+# have been recorded (clients that never poll would otherwise leak them).
+EXECUTOR       = ThreadPoolExecutor(max_workers=4, thread_name_prefix="post-detect")
+_SITREP_STATUS = OrderedDict()
+_SITREP_STATUS_MAX = 512
+_SITREP_LOCK   = threading.Lock()
+# Reverse geocoding is a network round trip; it overlaps with inference
+GEO_EXECUTOR   = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geo")
+
+
+def _save_upload(file, save_path: str) -> None:
+    """Copy the upload stream to disk in 1 MiB chunks (Werkzeug uses 16 KiB)."""
+    with open(save_path, "wb") as out:
+        shutil.copyfileobj(file.stream, out, length=_UPLOAD_CHUNK)
+
+
+def _set_sitrep_status(scan_id: str, status: dict) -> None:
+    """Record *status* for *scan_id*, evicting the oldest entries past the cap."""
+    with _SITREP_LOCK:
+        _SITREP_STATUS[scan_id] = status
+        _SITREP_STATUS.move_to_end(scan_id)
+        while len(_SITREP_STATUS) > _SITREP_STATUS_MAX:
+            _SITREP_STATUS.popitem(last=False)
+
+
+def _post_process(unique_name: str, result: dict, threat: dict, scan_id: str) -> None:
+    """Log detections and generate/store the SITREP (runs on EXECUTOR)."""
+    try:
+        log_detections(
+            image_filename = unique_name,
+            detections     = result["detections"],
+            threat_report  = threat,
+            inference_ms   = result["inference_ms"],
+        )
+    except Exception:
+        log.exception("Detection logging failed for %s", unique_name)
+
+    if not config.ANALYST_ENABLED:
+        return
+    from services.analyst import generate_sitrep
+
+    # Build full detection data for analyst
+    detection_data = {
+        "detections": result["detections"],
+        "threat": threat,
+        "annotated_path": result["annotated_path"],
+        "inference_ms": result["inference_ms"],
+        "image_size": result["image_size"],
+        "original_path": f"/static/uploads/{unique_name}"
+    }
+
+    try:
+        sitrep_result = generate_sitrep(detection_data)
+
+        # Store SITREP if successful
+        if sitrep_result["success"]:
+            get_store().save_sitrep(
+                scan_id=scan_id,
+                detection_context=sitrep_result["context"],
+                sitrep=sitrep_result["sitrep"],
+                model=sitrep_result["model"],
+                tokens=sitrep_result["tokens"]
+            )
+    except Exception as exc:
+        log.exception("SITREP generation failed for scan %s", scan_id)
+        sitrep_result = {"success": False, "error": str(exc)}
+
+    if sitrep_result["success"]:
+        with _SITREP_LOCK:
+            _SITREP_STATUS.pop(scan_id, None)   # now served from the store
+    else:
+        _set_sitrep_status(scan_id, sitrep_result)
 
 
 # ── Routes ────────────────────────────────────────────────────────────────────
@@ -179,58 +407,40 @@ def detect():
     # ── Save original upload ───────────────────────────────────────────────
     unique_name  = _unique_filename(file.filename)
     save_path    = os.path.join(config.UPLOAD_FOLDER, unique_name)
-    file.save(save_path)
+    _save_upload(file, save_path)
     log.info("Image saved: %s", save_path)
 
-    # ── Extract GPS data if present ────────────────────────────────────────
-    geo_data = extract_gps(save_path)
+    # ── Extract GPS data if present (runs while the model is busy) ─────────
+    geo_future = GEO_EXECUTOR.submit(extract_gps, save_path)
 
     # ── Run detection ──────────────────────────────────────────────────────
     try:
-        result = run_detection(MODEL, save_path)
+        result = BATCHER.submit(save_path).result()
     except Exception as exc:
         log.exception("Detection failed for %s", save_path)
         return jsonify({"success": False, "error": str(exc)}), 500
 
     # ── Threat assessment ──────────────────────────────────────────────────
-    threat = check_threat(result["detections"])
-
-    # ── Log to CSV ─────────────────────────────────────────────────────────
-    log_detections(
-        image_filename = unique_name,
-        detections     = result["detections"],
-        threat_report  = threat,
-        inference_ms   = result["inference_ms"],
-    )
+    threat = check_threat(result["detections"], result["detections_soa"])
 
-    # ── Generate AI SITREP ─────────────────────────────────────────────
+    # ── Log + SITREP in the background ─────────────────────────────────────
+    # The LLM call can take seconds; the client polls /api/sitrep/<scan_id>.
     scan_id = unique_name.split('_')[0]  # Use first part of filename as scan ID
-    sitrep_result = {"success": False, "error": "Analyst disabled"}
-    
     if config.ANALYST_ENABLED:
-        # Build full detection data for analyst
-        detection_data = {
-            "detections": result["detections"],
-            "threat": threat,
-            "annotated_path": result["annotated_path"],
-            "inference_ms": result["inference_ms"],
-            "image_size": result["image_size"],
-            "original_path": f"/static/uploads/{unique_name}"
-        }
-        
-        # Generate SITREP
-        sitrep_result = generate_sitrep(detection_data)
-        
-        # Store SITREP if successful
-        if sitrep_result["success"]:
-            detection_context = build_detection_context(detection_data)
-            get_store().save_sitrep(
-                scan_id=scan_id,
-                detection_context=detection_context,
-                sitrep=sitrep_result["sitrep"],
-                model=sitrep_result["model"],
-                tokens=sitrep_result["tokens"]
-            )
+        sitrep_result = {"success": False, "status": "pending"}
+        _set_sitrep_status(scan_id, sitrep_result)
+    else:
+        sitrep_result = {"success": False, "error": "Analyst disabled"}
+
+    EXECUTOR.submit(_post_process, unique_name, result, threat, scan_id)
+
+    # The client fetches the annotated image right after this response
+    try:
+        result["annotated_ready"].result()
+    except Exception:
+        log.exception("Writing annotated image failed for %s", save_path)
+
+    geo_data = geo_future.result()
 
     # ── Build response ─────────────────────────────────────────────────
     return jsonify({
@@ -287,15 +497,11 @@ def dashboard_data():
 
 @app.route("/api/export-csv")
 def export_csv():
-    """GET /api/export-csv — download the full detection log CSV."""
-    if not os.path.exists(config.LOG_PATH):
-        return jsonify({"success": False, "error": "No log file found"}), 404
-    return send_from_directory(
-        os.path.dirname(config.LOG_PATH),
-        os.path.basename(config.LOG_PATH),
-        as_attachment=True,
-        download_name="aegis_detections.csv",
-        mimetype="text/csv"
+    """GET /api/export-csv — stream the full detection log as CSV."""
+    return Response(
+        stream_with_context(iter_csv()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=aegis_detections.csv"},
     )
 
 
@@ -305,6 +511,20 @@ def get_sitrep(scan_id):
     sitrep_data = get_store().get_sitrep(scan_id)
     
     if not sitrep_data:
+        with _SITREP_LOCK:
+            status = _SITREP_STATUS.get(scan_id)
+            if status and status.get("status") != "pending":
+                _SITREP_STATUS.pop(scan_id)     # report a failure once
+        if status is None:
+            # _post_process may have saved the SITREP and cleared its
+            # status between the store read above and the lookup
+            sitrep_data = get_store().get_sitrep(scan_id)
+    
+    if not sitrep_data:
+        if status and status.get("status") == "pending":
+            return jsonify({"success": False, "scan_id": scan_id, "status": "pending"}), 202
+        if status:
+            return jsonify({"success": False, "error": status.get("error", "SITREP failed")}), 500
         return jsonify({"success": False, "error": "SITREP not found"}), 404
     
     return jsonify({
@@ -341,6 +561,7 @@ def chat():
     chat_history = get_store().get_chat_history(scan_id)
     
     # Call analyst
+    from services.analyst import analyst_chat
     response = analyst_chat(
         scan_id=scan_id,
         user_message=message,
@@ -357,7 +578,69 @@ def chat():
     return jsonify(response)
 
 
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    POST /api/chat/stream — like /api/chat, but the answer arrives as
+    Server-Sent Events while it is generated:
+        data: {"delta": "..."}                  (repeated)
+        data: {"done": true, "answer": "..."}   or   data: {"error": "..."}
+    """
+    data = request.get_json()
+
+    if not data:
+        return jsonify({"success": False, "error": "No JSON data provided"}), 400
+
+    scan_id = data.get("scan_id")
+    message = data.get("message")
+
+    if not scan_id or not message:
+        return jsonify({"success": False, "error": "Missing scan_id or message"}), 400
+
+    if not config.ANALYST_ENABLED:
+        return jsonify({"success": False, "error": "Analyst disabled"}), 503
+
+    sitrep_data = get_store().get_sitrep(scan_id)
+
+    if not sitrep_data:
+        return jsonify({"success": False, "error": "Scan not found"}), 404
+
+    chat_history = get_store().get_chat_history(scan_id)
+
+    from services.analyst import analyst_chat_stream
+
+    def events():
+        parts = []
+        try:
+            for chunk in analyst_chat_stream(
+                scan_id=scan_id,
+                user_message=message,
+                detection_context=sitrep_data.get("detection_context", ""),
+                sitrep=sitrep_data.get("sitrep", ""),
+                chat_history=chat_history
+            ):
+                parts.append(chunk)
+                yield f"data: {app.json.dumps({'delta': chunk})}\n\n"
+        except Exception as exc:
+            log.exception("Streaming chat failed for scan %s", scan_id)
+            yield f"data: {app.json.dumps({'error': f'LLM error: {exc}'})}\n\n"
+            return
+
+        answer = "".join(parts)
+        get_store().add_chat_message(scan_id, "user", message)
+        get_store().add_chat_message(scan_id, "assistant", answer)
+        yield f"data: {app.json.dumps({'done': True, 'answer': answer})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ── Dev server ────────────────────────────────────────────────────────────────
+# Development only — production runs under gunicorn via wsgi.py / run.sh, where
+# the model is loaded once per worker and use_reloader does not apply.
 if __name__ == "__main__":
     log.info("Starting Military Detection System on http://%s:%s", config.HOST, config.PORT)
     app.run(
@@ -6,12 +6,15 @@ All tunable parameters live here — no magic numbers elsewhere.
 """
 
 import os
+import sys
+from functools import lru_cache
 
 # ── Paths ────────────────────────────────────────────────────────────────────
 BASE_DIR      = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH    = os.path.join(BASE_DIR, "models", "best_model.pt")
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
-LOG_PATH      = os.path.join(BASE_DIR, "logs", "detections.csv")
+LOG_DB_PATH   = os.path.join(BASE_DIR, "logs", "aegis.db")          # detection log (SQLite)
+LOG_PATH      = os.path.join(BASE_DIR, "logs", "detections.csv")    # legacy CSV log (imported once)
 
 # ── Model settings ────────────────────────────────────────────────────────────
 # Model type selection: "auto", "military", "dota", "coco"
@@ -22,6 +25,23 @@ MILITARY_MODEL_PATH = os.path.join(BASE_DIR, "models", "best_model.pt")
 DOTA_MODEL_PATH = os.path.join(BASE_DIR, "models", "dota_model.pt")
 COCO_MODEL_PATH = "yolo11n.pt"  # downloaded automatically by Ultralytics
 
+
+def _resolve_weights() -> str:
+    """Pick the weights for MODEL_TYPE, falling back to COCO when missing."""
+    candidates = {
+        "dota":     [DOTA_MODEL_PATH],
+        "military": [MILITARY_MODEL_PATH],
+        "coco":     [],
+    }.get(MODEL_TYPE, [MILITARY_MODEL_PATH, DOTA_MODEL_PATH])  # auto
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return COCO_MODEL_PATH
+
+
+# Resolved once at import so forked workers skip the filesystem probes
+RESOLVED_WEIGHTS = _resolve_weights()
+
 # Fallback to the standard COCO-pretrained YOLOv11n when no custom weights exist.
 # Replace MODEL_PATH above with your own fine-tuned weights to detect
 # domain-specific military equipment.
@@ -31,13 +51,35 @@ IOU_THRESH         = 0.45            # NMS IoU threshold
 MAX_DETECTIONS     = 100             # cap on detections per image
 DEVICE             = ""              # "" = auto (CUDA if available, else CPU)
 
+# ── TensorRT acceleration ────────────────────────────────────────────────────
+# When enabled (and a CUDA GPU is present) the chosen weights are exported once
+# to an FP16 TensorRT engine under models/ and that engine is served instead.
+USE_TRT         = os.environ.get("USE_TRT", "true").lower() == "true"
+MAX_BATCH       = int(os.environ.get("MAX_BATCH", 8))
+TRT_ENGINE_PATH = os.environ.get("TRT_ENGINE_PATH", "")  # "" = derive from weights
+
+# Portable alternative to TensorRT: a dynamic-batch ONNX export served by
+# ONNX Runtime (install onnxruntime-gpu for CUDA). Used only when TensorRT is
+# not in use.
+USE_ONNX        = os.environ.get("USE_ONNX", "false").lower() == "true"
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "")  # "" = derive from weights
+
+# ── Request batching ──────────────────────────────────────────────────────────
+# Concurrent /detect uploads are grouped into one model call of up to
+# MAX_BATCH images, waiting at most BATCH_MAX_WAIT_MS for stragglers.
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 8))
+
 # ── Threat classification ─────────────────────────────────────────────────────
 # Military class names for custom-trained model.
 # These match the UNIFIED_CLASSES in scripts/prepare_dataset.py
 # Update these after deploying your custom military model.
 
+def _interned(names) -> frozenset:
+    """Freeze a class-name set, interning each name for cheap lookups."""
+    return frozenset(sys.intern(n) for n in names)
+
 # DOTA CLASSES (Aerial Object Detection)
-DOTA_HIGH_RISK_CLASSES = {
+DOTA_HIGH_RISK_CLASSES = _interned({
     # Military aircraft
     "plane", "helicopter",
     # Naval vessels
@@ -46,9 +88,9 @@ DOTA_HIGH_RISK_CLASSES = {
     "large-vehicle",
     # Strategic infrastructure
     "bridge",
-}
+})
 
-DOTA_MEDIUM_RISK_CLASSES = {
+DOTA_MEDIUM_RISK_CLASSES = _interned({
     # Civilian vehicles
     "small-vehicle",
     # Infrastructure
@@ -58,11 +100,11 @@ DOTA_MEDIUM_RISK_CLASSES = {
     "soccer-ball-field", "swimming-pool",
     # Traffic
     "roundabout",
-}
+})
 
 # MILITARY CLASSES (Ground-level Military Equipment)
 # HIGH RISK: Direct combat threats and heavy military equipment
-MILITARY_HIGH_RISK_CLASSES = {
+MILITARY_HIGH_RISK_CLASSES = _interned({
     # Heavy armor & artillery
     "tank", "armored_vehicle", "missile_launcher", "artillery",
     "rocket_launcher", "anti_aircraft_gun",
@@ -70,10 +112,10 @@ MILITARY_HIGH_RISK_CLASSES = {
     "fighter_jet", "attack_helicopter", "combat_drone",
     # Naval threats
     "warship", "submarine",
-}
+})
 
 # MEDIUM RISK: Support equipment and reconnaissance
-MILITARY_MEDIUM_RISK_CLASSES = {
+MILITARY_MEDIUM_RISK_CLASSES = _interned({
     # Support vehicles & equipment
     "military_truck", "patrol_boat", "military_helicopter",
     "radar_station", "bunker",
@@ -83,32 +125,31 @@ MILITARY_MEDIUM_RISK_CLASSES = {
     "military_personnel",
     # Infrastructure
     "runway", "helipad",
-}
+})
 
 # COCO CLASSES (General Object Detection - Fallback)
-COCO_HIGH_RISK_CLASSES = {
+COCO_HIGH_RISK_CLASSES = _interned({
     # Vehicles (COCO fallback classes for pretrained model)
     "truck", "bus", "car", "airplane", "helicopter",
     # Weapons (COCO fallback)
     "knife", "scissors",
-}
+})
 
-COCO_MEDIUM_RISK_CLASSES = {
+COCO_MEDIUM_RISK_CLASSES = _interned({
     # COCO fallback classes
     "person", "backpack", "handbag", "boat", "train",
     "bicycle", "motorcycle",
-}
+})
 
-# Dynamic class selection based on MODEL_TYPE
+# Dynamic class selection based on MODEL_TYPE (fixed for the process lifetime)
+@lru_cache(maxsize=None)
 def get_risk_classes():
     """Get appropriate risk classes based on current model type"""
-    model_type = os.environ.get("MODEL_TYPE", "auto").lower()
-    
-    if model_type == "dota":
+    if MODEL_TYPE == "dota":
         return DOTA_HIGH_RISK_CLASSES, DOTA_MEDIUM_RISK_CLASSES
-    elif model_type == "military":
+    elif MODEL_TYPE == "military":
         return MILITARY_HIGH_RISK_CLASSES, MILITARY_MEDIUM_RISK_CLASSES
-    elif model_type == "coco":
+    elif MODEL_TYPE == "coco":
         return COCO_HIGH_RISK_CLASSES, COCO_MEDIUM_RISK_CLASSES
     else:  # auto - try to detect from model
         return COCO_HIGH_RISK_CLASSES, COCO_MEDIUM_RISK_CLASSES
@@ -117,20 +158,28 @@ def get_risk_classes():
 HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES = get_risk_classes()
 
 # ── Upload constraints ────────────────────────────────────────────────────────
-ALLOWED_EXTENSIONS  = {"png", "jpg", "jpeg", "gif", "bmp", "webp", "tiff"}
+ALLOWED_EXTENSIONS  = frozenset({"png", "jpg", "jpeg", "gif", "bmp", "webp", "tiff"})
 MAX_CONTENT_LENGTH  = 32 * 1024 * 1024  # 32 MB
+# Uploads up to this size stay in RAM while parsing (Werkzeug spills >500 KB to a temp file)
+UPLOAD_SPOOL_MAX    = int(float(os.environ.get("UPLOAD_SPOOL_MAX_MB", "32")) * 1024 * 1024)
 
 # ── Flask ─────────────────────────────────────────────────────────────────────
 SECRET_KEY = os.environ.get("SECRET_KEY", "mil-detect-dev-key-change-in-prod")
 DEBUG      = os.environ.get("DEBUG", "true").lower() == "true"
 PORT       = int(os.environ.get("PORT", 5000))
 HOST       = os.environ.get("HOST", "0.0.0.0")
+# Hand static file responses to the front-end server (X-Sendfile header)
+# instead of streaming them through Python. Only enable behind Apache mod_xsendfile or
+# lighttpd — without one the client receives an empty body.
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
 
 # ── Annotation colours (BGR for OpenCV) ──────────────────────────────────────
 COLOR_HIGH_RISK   = (0,   0,   255)   # red
 COLOR_MEDIUM_RISK = (0,  140,  255)   # orange
 COLOR_LOW_RISK    = (0,  200,   80)   # green
 COLOR_TEXT_BG     = (0,   0,    0)    # black pill behind label text
+# Annotated JPEGs are shrunk to this long edge before encoding (0 = full size)
+ANNOTATED_MAX_SIDE = int(os.environ.get("ANNOTATED_MAX_SIDE", "1920"))
 
 
 # ── AI Tactical Analyst ───────────────────────────────────────────────────
@@ -149,6 +198,13 @@ LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/llama-3.2-3b-instruct:free")
 LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://openrouter.ai/api/v1")
 LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", "2048"))
 LLM_TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0.7"))
+# Upper bound on in-flight provider calls (SITREPs + chat) across all threads
+LLM_MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENT", "5"))
+# SITREP/chat responses memoised by prompt digest (0 disables the cache)
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_S = float(os.environ.get("LLM_CACHE_TTL_S", "3600"))
+# Streamed chat answers are forwarded to the browser in windows of this length
+CHAT_STREAM_FLUSH_MS = float(os.environ.get("CHAT_STREAM_FLUSH_MS", "50"))
 
 # Determine if analyst is enabled based on provider
 def _check_analyst_enabled():
@@ -165,7 +221,9 @@ def _check_analyst_enabled():
     return False
 
 ANALYST_ENABLED = _check_analyst_enabled()
-SITREP_STORE_PATH = os.path.join(BASE_DIR, "logs", "sitreps.json")
+SITREP_STORE_PATH = os.path.join(BASE_DIR, "logs", "sitreps.jsonl")
+# Journal is compacted into a snapshot once it grows past this size
+SITREP_JOURNAL_MAX_MB = float(os.getenv("SITREP_JOURNAL_MAX_MB", "8"))
 
 # Legacy Claude-specific settings (for backward compatibility)
 CLAUDE_MODEL = os.environ.get("CLAUDE_MODEL", "claude-sonnet-4-20250514")
@@ -0,0 +1,12 @@
+#!/usr/bin/env bash
+# Start AEGIS under gunicorn: one worker (one model in VRAM), eight threads so
+# uploads, dashboard polling and slow LLM calls can overlap.
+set -euo pipefail
+cd "$(dirname "$0")"
+
+HOST="${HOST:-0.0.0.0}"
+PORT="${PORT:-5000}"
+THREADS="${THREADS:-8}"
+
+exec gunicorn -w 1 --threads "${THREADS}" -k gthread \
+    -b "${HOST}:${PORT}" --timeout 120 wsgi:application
@@ -5,41 +5,61 @@ at specific Indian locations.
 """
 import os
 import random
-from PIL import Image
+import shutil
+import cv2
 import piexif
-from pathlib import Path
+import numpy as np
 
-def decimal_to_dms(decimal_degree):
-    """Convert decimal degrees to degrees, minutes, seconds format for EXIF."""
-    is_positive = decimal_degree >= 0
-    decimal_degree = abs(decimal_degree)
-    
-    degrees = int(decimal_degree)
-    minutes_decimal = (decimal_degree - degrees) * 60
-    minutes = int(minutes_decimal)
-    seconds = (minutes_decimal - minutes) * 60
-    
-    return (
-        (degrees, 1),
-        (minutes, 1),
-        (int(seconds * 100), 100)
-    )
+def decimal_to_dms(decimal_degrees):
+    """
+    Convert decimal degrees to EXIF degrees/minutes/seconds rationals.
+
+    Accepts a scalar or a sequence of coordinates and returns an (N, 3, 2)
+    int array of (numerator, denominator) pairs — seconds keep 2 decimals.
+    """
+    values = np.abs(np.atleast_1d(np.asarray(decimal_degrees, dtype=np.float64)))
+
+    minutes_frac, degrees = np.modf(values)
+    seconds_frac, minutes = np.modf(minutes_frac * 60)
+    seconds_100 = np.trunc(seconds_frac * 6000)
+
+    dms = np.empty((values.size, 3, 2), dtype=np.int64)
+    dms[:, 0, 0] = degrees
+    dms[:, 1, 0] = minutes
+    dms[:, 2, 0] = seconds_100
+    dms[:, :, 1] = (1, 1, 100)
+    return dms
+
+def _dms_rationals(dms_row):
+    """Turn one (3, 2) row of decimal_to_dms() into piexif's tuple format."""
+    return tuple((int(num), int(den)) for num, den in dms_row)
+
+def _is_jpeg(path):
+    """Sniff the SOI marker rather than trusting the file extension."""
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\xff\xd8'
 
 def add_gps_to_image(input_path, output_path, latitude, longitude, altitude=None):
-    """Add GPS EXIF data to an existing image."""
+    """
+    Add GPS EXIF data to an existing image.
+
+    JPEGs are copied byte-for-byte and only their EXIF segment is rewritten,
+    so pixels are never decoded or re-compressed. Other formats are encoded
+    to JPEG once in memory and the EXIF segment is inserted into those bytes.
+    """
     try:
-        # Open the image
-        img = Image.open(input_path)
+        is_jpeg = _is_jpeg(input_path)
         
         # Try to get existing EXIF data
         try:
-            exif_dict = piexif.load(img.info.get('exif', b''))
-        except:
+            exif_dict = piexif.load(input_path) if is_jpeg else None
+        except Exception:
+            exif_dict = None
+        if not exif_dict:
             exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
         
         # Prepare GPS data
-        lat_dms = decimal_to_dms(latitude)
-        lon_dms = decimal_to_dms(longitude)
+        lat_dms, lon_dms = (_dms_rationals(row) for row in decimal_to_dms((latitude, longitude)))
         
         lat_ref = 'N' if latitude >= 0 else 'S'
         lon_ref = 'E' if longitude >= 0 else 'W'
@@ -70,7 +90,17 @@ def add_gps_to_image(input_path, output_path, latitude, longitude, altitude=None
         exif_bytes = piexif.dump(exif_dict)
         
         # Save with GPS data
-        img.save(output_path, "jpeg", exif=exif_bytes, quality=95)
+        if is_jpeg:
+            shutil.copyfile(input_path, output_path)
+            piexif.insert(exif_bytes, output_path)
+        else:
+            image = cv2.imread(input_path, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"could not read {input_path}")
+            ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            if not ok:
+                raise ValueError(f"could not encode {input_path}")
+            piexif.insert(exif_bytes, encoded.tobytes(), output_path)
         
         return True
         
@@ -3,35 +3,102 @@ Create test images with GPS EXIF data for Indian locations.
 This script generates sample images with embedded GPS coordinates.
 """
 import os
-from PIL import Image
-import piexif
+import sys
+import queue
+import threading
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw
+import piexif
+import numpy as np
 
-def decimal_to_dms(decimal_degree):
-    """Convert decimal degrees to degrees, minutes, seconds format for EXIF."""
-    is_positive = decimal_degree >= 0
-    decimal_degree = abs(decimal_degree)
-    
-    degrees = int(decimal_degree)
-    minutes_decimal = (decimal_degree - degrees) * 60
-    minutes = int(minutes_decimal)
-    seconds = (minutes_decimal - minutes) * 60
-    
-    # EXIF format: (numerator, denominator) for each component
-    return (
-        (degrees, 1),
-        (minutes, 1),
-        (int(seconds * 100), 100)  # Store seconds with 2 decimal precision
-    )
-
-def create_image_with_gps(output_path, latitude, longitude, altitude=None, location_name=""):
-    """Create a test image with GPS EXIF data."""
+try:
+    import simplejpeg  # libjpeg-turbo directly, ~30% faster than PIL's encoder
+except ImportError:  # optional — fall back to PIL
+    simplejpeg = None
+
+# Solid background shared by every test image; each call draws on a copy
+# (built once per process, including each ProcessPoolExecutor worker).
+_BASE_CANVAS = Image.new('RGB', (640, 480), color=(73, 109, 137))
+
+# Camera tags shared by every test image; piexif.dump only reads this dict,
+# so each call references it and supplies its own GPS IFD.
+_BASE_0TH_IFD = {
+    piexif.ImageIFD.Make: "AEGIS Test",
+    piexif.ImageIFD.Model: "GPS Test Generator",
+    piexif.ImageIFD.Software: "AEGIS Module 6",
+}
+
+def decimal_to_dms(decimal_degrees):
+    """
+    Convert decimal degrees to EXIF degrees/minutes/seconds rationals.
+
+    Accepts a scalar or a sequence of coordinates and returns an (N, 3, 2)
+    int array of (numerator, denominator) pairs — seconds keep 2 decimals.
+    """
+    values = np.abs(np.atleast_1d(np.asarray(decimal_degrees, dtype=np.float64)))
+
+    minutes_frac, degrees = np.modf(values)
+    seconds_frac, minutes = np.modf(minutes_frac * 60)
+    seconds_100 = np.trunc(seconds_frac * 6000)
+
+    dms = np.empty((values.size, 3, 2), dtype=np.int64)
+    dms[:, 0, 0] = degrees
+    dms[:, 1, 0] = minutes
+    dms[:, 2, 0] = seconds_100
+    dms[:, :, 1] = (1, 1, 100)
+    return dms
+
+def _dms_rationals(dms_row):
+    """Turn one (3, 2) row of decimal_to_dms() into piexif's tuple format."""
+    return tuple((int(num), int(den)) for num, den in dms_row)
+
+def _encode_jpeg(img, exif_bytes):
+    """Encode *img* as a JPEG carrying *exif_bytes*, entirely in memory."""
+    buf = BytesIO()
+    if simplejpeg is not None:
+        jpeg_bytes = simplejpeg.encode_jpeg(np.asarray(img), quality=95, colorspace='RGB')
+        piexif.insert(exif_bytes, jpeg_bytes, buf)
+    else:
+        img.save(buf, "jpeg", exif=exif_bytes, quality=95)
+    return buf.getvalue()
+
+def _write_file(path, data):
+    """Write *data* with one unbuffered os.write (looping only on short writes)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     try:
-        # Create a simple colored image (640x480)
-        img = Image.new('RGB', (640, 480), color=(73, 109, 137))
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _writer(writer_q, failures):
+    """Writer thread: drain ``(path, data)`` items until a ``None`` sentinel."""
+    while (item := writer_q.get()) is not None:
+        path, data = item
+        try:
+            _write_file(path, data)
+        except OSError as e:
+            failures.append(f"✗ Error writing {path}: {e}\n")
+
+def create_image_with_gps(output_path, latitude, longitude, altitude=None, location_name="",
+                          lat_dms=None, lon_dms=None, write=_write_file):
+    """
+    Create a test image with GPS EXIF data.
+
+    *lat_dms* / *lon_dms* take precomputed rows of decimal_to_dms(); they are
+    derived from the coordinates when omitted. *write(path, data)* stores the
+    encoded JPEG; pass a different callable to hand the bytes off elsewhere.
+
+    Returns ``(success, report)``; the caller prints the report text, so
+    output from parallel workers stays in order and is written in one go.
+    """
+    try:
+        # Start from the shared 640x480 background
+        img = _BASE_CANVAS.copy()
         
         # Add some text to the image
-        from PIL import ImageDraw, ImageFont
         draw = ImageDraw.Draw(img)
         
         # Draw location info on image
@@ -39,11 +106,14 @@ def create_image_with_gps(output_path, latitude, longitude, altitude=None, locat
         draw.text((20, 20), text, fill=(255, 255, 255))
         
         # Prepare GPS data
-        lat_dms = decimal_to_dms(latitude)
-        lon_dms = decimal_to_dms(longitude)
+        if lat_dms is None or lon_dms is None:
+            lat_dms, lon_dms = decimal_to_dms((latitude, longitude))
+        lat_dms = _dms_rationals(lat_dms)
+        lon_dms = _dms_rationals(lon_dms)
         
         lat_ref = 'N' if latitude >= 0 else 'S'
         lon_ref = 'E' if longitude >= 0 else 'W'
+        altitude = altitude or 0  # always emitted, so every GPS IFD has the same layout
         
         # Create GPS IFD
         gps_ifd = {
@@ -51,41 +121,43 @@ def create_image_with_gps(output_path, latitude, longitude, altitude=None, locat
             piexif.GPSIFD.GPSLatitude: lat_dms,
             piexif.GPSIFD.GPSLongitudeRef: lon_ref,
             piexif.GPSIFD.GPSLongitude: lon_dms,
+            piexif.GPSIFD.GPSAltitude: (int(altitude * 10), 10),
+            piexif.GPSIFD.GPSAltitudeRef: 0,  # 0 = above sea level
         }
         
-        # Add altitude if provided
-        if altitude is not None:
-            gps_ifd[piexif.GPSIFD.GPSAltitude] = (int(altitude * 10), 10)
-            gps_ifd[piexif.GPSIFD.GPSAltitudeRef] = 0  # 0 = above sea level
-        
         # Create EXIF data
-        exif_dict = {
-            "GPS": gps_ifd,
-            "0th": {
-                piexif.ImageIFD.Make: "AEGIS Test",
-                piexif.ImageIFD.Model: "GPS Test Generator",
-                piexif.ImageIFD.Software: "AEGIS Module 6",
-            }
-        }
+        exif_dict = {"GPS": gps_ifd, "0th": _BASE_0TH_IFD}
         
-        # Convert to bytes
+        # Convert to bytes (~40µs; JPEG encoding dominates at ~1ms per image)
         exif_bytes = piexif.dump(exif_dict)
         
         # Save image with EXIF data
-        img.save(output_path, "jpeg", exif=exif_bytes, quality=95)
+        write(output_path, _encode_jpeg(img, exif_bytes))
         
-        print(f"✓ Created: {output_path}")
-        print(f"  Location: {location_name}")
-        print(f"  GPS: {latitude:.6f}, {longitude:.6f}")
-        if altitude:
-            print(f"  Altitude: {altitude}m")
-        print()
-        
-        return True
+        report = (
+            f"✓ Created: {output_path}\n"
+            f"  Location: {location_name}\n"
+            f"  GPS: {latitude:.6f}, {longitude:.6f}\n"
+            f"  Altitude: {altitude}m\n"
+            "\n"
+        )
+        return True, report
         
     except Exception as e:
-        print(f"✗ Error creating {output_path}: {e}")
-        return False
+        return False, f"✗ Error creating {output_path}: {e}\n"
+
+def _render_one(args):
+    """
+    ProcessPoolExecutor entry point: create_image_with_gps(*args), returning
+    the encoded file instead of writing it so the parent's writer thread does
+    the disk I/O while workers move on to the next image.
+    """
+    output_path, lat, lon, alt, name, lat_dms, lon_dms = args
+    encoded = []
+    ok, report = create_image_with_gps(output_path, lat, lon, alt, name,
+                                       lat_dms=lat_dms, lon_dms=lon_dms,
+                                       write=lambda path, data: encoded.append((path, data)))
+    return ok, report, encoded
 
 def main():
     """Generate test images for various Indian locations."""
@@ -128,11 +200,33 @@ def main():
     print("=" * 70)
     print(f"Creating {len(locations)} test images with Indian GPS coordinates...\n")
     
-    success_count = 0
-    for filename, lat, lon, alt, name in locations:
-        output_path = os.path.join(output_dir, filename)
-        if create_image_with_gps(output_path, lat, lon, alt, name):
-            success_count += 1
+    # Convert every coordinate to EXIF rationals in one vectorised pass
+    lat_dms = decimal_to_dms([loc[1] for loc in locations])
+    lon_dms = decimal_to_dms([loc[2] for loc in locations])
+
+    # Each image is independent and JPEG encoding is CPU-bound: use all cores.
+    # Finished JPEGs go to one writer thread, so file writes overlap encoding.
+    jobs = [
+        (os.path.join(output_dir, filename), lat, lon, alt, name, lat_dms[i], lon_dms[i])
+        for i, (filename, lat, lon, alt, name) in enumerate(locations)
+    ]
+    writer_q = queue.Queue(maxsize=4)
+    write_failures = []
+    writer = threading.Thread(target=_writer, args=(writer_q, write_failures))
+    writer.start()
+    results = []
+    try:
+        with ProcessPoolExecutor() as executor:
+            for ok, report, encoded in executor.map(_render_one, jobs, chunksize=2):
+                for item in encoded:
+                    writer_q.put(item)
+                results.append((ok, report))
+    finally:
+        writer_q.put(None)
+        writer.join()
+    
+    sys.stdout.write("".join(report for _, report in results) + "".join(write_failures))
+    success_count = sum(ok for ok, _ in results) - len(write_failures)
     
     print("=" * 70)
     print(f"COMPLETE: {success_count}/{len(locations)} images created successfully")
@@ -6,9 +6,77 @@ Deploys trained DOTA model to AEGIS system
 
 import os
 import sys
+import mmap
 import shutil
+import hashlib
 from pathlib import Path
 
+_CHUNK = 1 << 20  # 1 MiB
+
+
+def _copy_and_hash(src, dst):
+    """
+    Copy *src* to *dst* and return the SHA-256 of the bytes copied.
+
+    The source is memory-mapped and each 1 MiB chunk is hashed and written
+    in the same pass, so the weights are read once; metadata is copied too.
+    """
+    digest = hashlib.sha256()
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if os.fstat(fsrc.fileno()).st_size:
+            with mmap.mmap(fsrc.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), _CHUNK):
+                    chunk = mm[offset:offset + _CHUNK]
+                    digest.update(chunk)
+                    fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return digest.hexdigest()
+
+
+def _drop_cached_exports(weights):
+    """Remove TensorRT/ONNX exports built from the weights being replaced."""
+    weights = Path(weights)
+    for pattern in (f"{weights.stem}_*.engine", f"{weights.stem}_*.onnx"):
+        for stale in weights.parent.glob(pattern):
+            print(f"Removing stale export: {stale}")
+            stale.unlink()
+
+
+def _build_int8_engine(source_model, deployed_model):
+    """
+    Export *source_model* to an INT8 TensorRT engine calibrated on the DOTA
+    dataset and place it where AEGIS looks for it:
+    models/<deployed stem>_int8_bs<MAX_BATCH>.engine.
+    """
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import config
+    from ultralytics import YOLO
+
+    data_yaml = Path("datasets/dota/data.yaml")
+    if not data_yaml.exists():
+        print(f"⚠ Skipping INT8 export: calibration data not found at {data_yaml}")
+        return
+
+    print("Building INT8 TensorRT engine (calibration takes a few minutes)...")
+    try:
+        exported = YOLO(str(source_model)).export(
+            format="engine",
+            int8=True,
+            data=str(data_yaml),
+            imgsz=640,
+            dynamic=True,
+            batch=config.MAX_BATCH,
+            workspace=4,
+        )
+    except Exception as e:
+        print(f"⚠ INT8 export failed ({e}); AEGIS will build an FP16 engine instead.")
+        return
+
+    engine = deployed_model.parent / f"{deployed_model.stem}_int8_bs{config.MAX_BATCH}.engine"
+    shutil.move(exported, engine)
+    print(f"✓ INT8 engine: {engine}")
+
+
 def deploy_dota_model():
     """Deploy DOTA model to AEGIS"""
     
@@ -41,17 +109,27 @@ def deploy_dota_model():
     
     choice = input("Select option (1/2/3): ").strip()
     
+    build_int8 = False
+    if choice in ("1", "2"):
+        answer = input("Also build an INT8 TensorRT engine? Needs a CUDA GPU (y/N): ")
+        build_int8 = answer.strip().lower() == "y"
+    
     if choice == "1":
         # Backup current model if exists
         current_model = Path("models/best_model.pt")
         if current_model.exists():
             backup = Path("models/best_model.pt.backup")
             print(f"Backing up current model to: {backup}")
-            shutil.copy(current_model, backup)
+            backup_sha256 = _copy_and_hash(current_model, backup)
+            print(f"Backup SHA-256: {backup_sha256}")
         
         # Copy DOTA model
         print(f"Deploying DOTA model to: {current_model}")
-        shutil.copy(source_model, current_model)
+        sha256 = _copy_and_hash(source_model, current_model)
+        print(f"SHA-256: {sha256}")
+        _drop_cached_exports(current_model)
+        if build_int8:
+            _build_int8_engine(source_model, current_model)
         
         print()
         print("✅ DOTA model deployed successfully!")
@@ -66,7 +144,11 @@ def deploy_dota_model():
         # Deploy as separate model
         dota_model = Path("models/dota_model.pt")
         print(f"Deploying DOTA model to: {dota_model}")
-        shutil.copy(source_model, dota_model)
+        sha256 = _copy_and_hash(source_model, dota_model)
+        print(f"SHA-256: {sha256}")
+        _drop_cached_exports(dota_model)
+        if build_int8:
+            _build_int8_engine(source_model, dota_model)
         
         print()
         print("✅ DOTA model deployed as separate model!")
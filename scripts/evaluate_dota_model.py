@@ -48,12 +48,18 @@ def evaluate_dota_model():
     print("This may take 5-10 minutes...")
     print()
     
+    # FP16 on the GPU when there is one; CPU evaluation stays FP32
+    import torch
+    cuda = torch.cuda.is_available()
+    print(f"Device: {'cuda:0 (FP16)' if cuda else 'cpu'}")
+    
     results = model.val(
         data=str(data_yaml),
         split="test",
         imgsz=640,
-        batch=8,
-        device="cpu"
+        batch=32 if cuda else 8,
+        device=0 if cuda else "cpu",
+        half=cuda
     )
     
     print()
@@ -7,12 +7,13 @@ Evaluate trained YOLO model on test set and generate performance report.
 Usage:
     python scripts/evaluate_model.py \
         --weights models/best_model.pt \
-        --data datasets/military/military.yaml
+        --data datasets/military/military.yaml \
+        [--plots] [--save-json]
 
 This script:
 1. Runs YOLO validation on the test split
 2. Captures mAP@50, mAP@50-95, precision, recall per class
-3. Generates confusion matrix image
+3. Generates confusion matrix image (with --plots)
 4. Prints per-class AP table sorted from worst to best
 5. Saves JSON summary with all metrics
 6. Provides recommendations for classes needing more data
@@ -25,11 +26,21 @@ import argparse
 import logging
 from pathlib import Path
 from datetime import datetime
+from operator import itemgetter
 
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader  # libyaml
+except ImportError:
+    from yaml import SafeLoader
 import numpy as np
 from ultralytics import YOLO
 
+try:
+    import orjson  # optional — much faster than json, serialises NumPy values
+except ImportError:
+    orjson = None
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -75,13 +86,34 @@ def parse_args():
         default=0.45,
         help="IoU threshold for NMS"
     )
+    parser.add_argument(
+        "--device",
+        default="",
+        help="Device to evaluate on, e.g. 0 or cpu (default: first GPU if available)"
+    )
+    parser.add_argument(
+        "--half",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="FP16 inference (default: on when evaluating on a GPU)"
+    )
+    parser.add_argument(
+        "--save-json",
+        action="store_true",
+        help="Also write COCO-format predictions JSON (slower: serialises every prediction)"
+    )
+    parser.add_argument(
+        "--plots",
+        action="store_true",
+        help="Render confusion matrix and PR/F1 curves (adds seconds of matplotlib/PNG encoding)"
+    )
     return parser.parse_args()
 
 
 def load_class_names(data_yaml: str):
     """Load class names from dataset YAML."""
     with open(data_yaml, "r") as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=SafeLoader)
     
     if isinstance(data["names"], dict):
         return [data["names"][i] for i in sorted(data["names"].keys())]
@@ -90,7 +122,10 @@ def load_class_names(data_yaml: str):
 
 def run_validation(model, data_yaml, args):
     """Run YOLO validation and return metrics."""
-    log.info("Running validation on test set...")
+    import torch
+    device = args.device or ("0" if torch.cuda.is_available() else "cpu")
+    half = (device != "cpu") if args.half is None else args.half
+    log.info(f"Running validation on test set (device={device}, half={half})...")
     
     metrics = model.val(
         data=data_yaml,
@@ -98,9 +133,11 @@ def run_validation(model, data_yaml, args):
         imgsz=args.imgsz,
         conf=args.conf,
         iou=args.iou,
-        save_json=True,
-        save_hybrid=False,
-        plots=True,
+        device=device,
+        half=half,
+        batch=32 if half else 16,
+        save_json=args.save_json,
+        plots=args.plots,
         verbose=True
     )
     
@@ -109,35 +146,40 @@ def run_validation(model, data_yaml, args):
 
 def extract_per_class_metrics(metrics, class_names):
     """Extract per-class metrics from validation results."""
-    per_class = []
-    
+    n_classes = len(class_names)
+    ap50 = np.zeros(n_classes)
+    ap50_95 = np.zeros(n_classes)
+
     # Get per-class AP values
-    if hasattr(metrics, "ap_class_index") and hasattr(metrics, "ap"):
-        ap_values = metrics.ap  # AP per class
-        
-        for i, class_name in enumerate(class_names):
-            if i < len(ap_values):
-                ap50 = float(ap_values[i, 0]) if ap_values.ndim > 1 else float(ap_values[i])
-                ap50_95 = float(np.mean(ap_values[i])) if ap_values.ndim > 1 else float(ap_values[i])
-            else:
-                ap50 = 0.0
-                ap50_95 = 0.0
-            
-            per_class.append({
-                "class_id": i,
-                "class_name": class_name,
-                "ap50": ap50,
-                "ap50_95": ap50_95
-            })
-    else:
-        # Fallback if metrics structure is different
-        for i, class_name in enumerate(class_names):
-            per_class.append({
-                "class_id": i,
-                "class_name": class_name,
-                "ap50": 0.0,
-                "ap50_95": 0.0
-            })
+    ap = getattr(metrics, "ap", None)
+    ap_class_index = getattr(metrics, "ap_class_index", None)
+    if ap is not None and ap_class_index is not None:
+        ap_values = np.asarray(ap, dtype=np.float64)  # AP per class
+        if ap_values.ndim > 1:
+            rows_50, rows_50_95 = ap_values[:, 0], ap_values.mean(axis=1)
+        else:
+            rows_50 = rows_50_95 = ap_values
+
+        # Rows follow ap_class_index (classes present in the val set);
+        # classes without labels keep AP 0.0
+        class_index = np.asarray(ap_class_index, dtype=np.int64)
+        if class_index.shape != rows_50.shape:
+            class_index = np.arange(len(rows_50))
+        keep = class_index < n_classes
+        ap50[class_index[keep]] = rows_50[keep]
+        ap50_95[class_index[keep]] = rows_50_95[keep]
+
+    per_class = [
+        {
+            "class_id": i,
+            "class_name": class_name,
+            "ap50": a50,
+            "ap50_95": a50_95
+        }
+        for i, (class_name, a50, a50_95) in enumerate(
+            zip(class_names, ap50.tolist(), ap50_95.tolist())
+        )
+    ]
     
     return per_class
 
@@ -149,11 +191,12 @@ def print_per_class_table(per_class_metrics):
     log.info("=" * 70)
     
     # Sort by AP50 (worst to best)
-    sorted_metrics = sorted(per_class_metrics, key=lambda x: x["ap50"])
-    
-    print(f"{'Rank':<6} {'Class Name':<25} {'AP@50':<10} {'AP@50-95':<10}")
-    print("-" * 70)
+    sorted_metrics = sorted(per_class_metrics, key=itemgetter("ap50"))
     
+    rows = [
+        f"{'Rank':<6} {'Class Name':<25} {'AP@50':<10} {'AP@50-95':<10}",
+        "-" * 70,
+    ]
     for rank, item in enumerate(sorted_metrics, 1):
         ap50_str = f"{item['ap50']:.3f}"
         ap50_95_str = f"{item['ap50_95']:.3f}"
@@ -166,11 +209,22 @@ def print_per_class_table(per_class_metrics):
         else:
             marker = "✅"
         
-        print(f"{rank:<6} {marker} {item['class_name']:<23} {ap50_str:<10} {ap50_95_str:<10}")
+        rows.append(f"{rank:<6} {marker} {item['class_name']:<23} {ap50_str:<10} {ap50_95_str:<10}")
+    
+    sys.stdout.write("\n".join(rows) + "\n")
     
     log.info("=" * 70)
 
 
+# AP@50 thresholds and the recommendation for each bucket between them
+_SEVERITY_BINS = np.array([0.1, 0.3])
+_RECOMMENDATION_TEMPLATES = (
+    "CRITICAL: {name} - Collect significantly more training data (10x current amount)",
+    "HIGH: {name} - Add more diverse examples and apply heavy augmentation",
+    "MEDIUM: {name} - Increase training data by 2-3x and verify annotations",
+)
+
+
 def generate_recommendations(per_class_metrics):
     """Generate recommendations for improving model performance."""
     log.info("=" * 70)
@@ -188,19 +242,18 @@ def generate_recommendations(per_class_metrics):
     
     recommendations = []
     
-    for item in sorted(weak_classes, key=lambda x: x["ap50"]):
+    weak_classes.sort(key=itemgetter("ap50"))
+    # Severity bucket per class in one pass: AP < 0.1 → 0, < 0.3 → 1, else 2
+    severities = np.searchsorted(
+        _SEVERITY_BINS, [item["ap50"] for item in weak_classes], side="right"
+    )
+    
+    for item, severity in zip(weak_classes, severities.tolist()):
         class_name = item["class_name"]
-        ap50 = item["ap50"]
-        
-        log.info(f"  • {class_name} (AP@50: {ap50:.3f})")
         
-        if ap50 < 0.1:
-            rec = f"CRITICAL: {class_name} - Collect significantly more training data (10x current amount)"
-        elif ap50 < 0.3:
-            rec = f"HIGH: {class_name} - Add more diverse examples and apply heavy augmentation"
-        else:
-            rec = f"MEDIUM: {class_name} - Increase training data by 2-3x and verify annotations"
+        log.info(f"  • {class_name} (AP@50: {item['ap50']:.3f})")
         
+        rec = _RECOMMENDATION_TEMPLATES[severity].format(name=class_name)
         recommendations.append(rec)
         log.info(f"    → {rec}")
     
@@ -221,15 +274,16 @@ def save_results(output_dir, metrics, per_class_metrics, recommendations, args):
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
+    box = metrics.box
     results = {
         "timestamp": datetime.now().isoformat(),
         "model_weights": args.weights,
         "dataset": args.data,
         "overall_metrics": {
-            "map50": float(metrics.box.map50) if hasattr(metrics.box, "map50") else 0.0,
-            "map50_95": float(metrics.box.map) if hasattr(metrics.box, "map") else 0.0,
-            "precision": float(metrics.box.mp) if hasattr(metrics.box, "mp") else 0.0,
-            "recall": float(metrics.box.mr) if hasattr(metrics.box, "mr") else 0.0,
+            "map50": float(getattr(box, "map50", 0.0)),
+            "map50_95": float(getattr(box, "map", 0.0)),
+            "precision": float(getattr(box, "mp", 0.0)),
+            "recall": float(getattr(box, "mr", 0.0)),
         },
         "per_class_metrics": per_class_metrics,
         "recommendations": recommendations,
@@ -241,8 +295,13 @@ def save_results(output_dir, metrics, per_class_metrics, recommendations, args):
     }
     
     results_path = output_dir / "results.json"
-    with open(results_path, "w") as f:
-        json.dump(results, f, indent=2)
+    if orjson is not None:
+        results_path.write_bytes(
+            orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        )
+    else:
+        with open(results_path, "w") as f:
+            json.dump(results, f, indent=2)
     
     log.info(f"Results saved to: {results_path}")
     
@@ -322,11 +381,12 @@ def main():
     save_results(args.output, metrics, per_class_metrics, recommendations, args)
     
     # Note about confusion matrix
-    log.info("")
-    log.info("=" * 70)
-    log.info("Confusion matrix and other plots saved to:")
-    log.info(f"  {Path(args.weights).parent}")
-    log.info("=" * 70)
+    if args.plots:
+        log.info("")
+        log.info("=" * 70)
+        log.info("Confusion matrix and other plots saved to:")
+        log.info(f"  {metrics.save_dir}")
+        log.info("=" * 70)
     
     log.info("")
     log.info("✅ Evaluation complete!")
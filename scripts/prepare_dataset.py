@@ -18,18 +18,37 @@ This script:
 5. Writes remapped labels to output/labels/{train,val,test}/
 6. Performs train/val/test split using the specified ratios
 7. Writes output/military.yaml with all class names
+
+With --shard-size N, steps 4-5 instead pack N samples per WebDataset-style
+tar shard in output/shards/ and list the shards in shards/manifest.jsonl.
+Ultralytics trains from the per-file layout, so this is for streaming
+loaders only.
 """
 
 import os
 import sys
+import json
 import shutil
+import filecmp
+import zlib
+import tarfile
 import random
 import argparse
 import logging
+import functools
+from collections import Counter
+from io import BytesIO
+from itertools import groupby
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper  # libyaml
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
 # ── Unified military class list ──────────────────────────────────────────────
 UNIFIED_CLASSES = [
@@ -54,6 +73,27 @@ UNIFIED_CLASSES = [
     "runway",
     "helipad"
 ]
+_UNIFIED_INDEX = {name: i for i, name in enumerate(UNIFIED_CLASSES)}
+
+# Common source-dataset spellings of unified classes, flattened to
+# variation → unified index (insertion order = match priority)
+_CLASS_VARIATIONS = {
+    "tank": ["main_battle_tank", "light_tank", "heavy_tank"],
+    "armored_vehicle": ["apc", "ifv", "armored_car", "armoured_vehicle"],
+    "fighter_jet": ["fighter", "jet_fighter", "combat_aircraft"],
+    "attack_helicopter": ["helicopter_gunship", "combat_helicopter"],
+    "military_truck": ["truck", "cargo_truck", "transport_truck"],
+    "military_personnel": ["soldier", "personnel", "troops"],
+    "warship": ["naval_vessel", "destroyer", "frigate", "cruiser"],
+    "patrol_boat": ["boat", "small_boat"],
+    "artillery": ["howitzer", "cannon", "field_gun"],
+    "missile_launcher": ["mlrs", "sam_launcher"],
+}
+_VARIATION_INDEX = {
+    variation: _UNIFIED_INDEX[unified_name]
+    for unified_name, variations in _CLASS_VARIATIONS.items()
+    for variation in variations
+}
 
 logging.basicConfig(
     level=logging.INFO,
@@ -91,6 +131,13 @@ def parse_args():
         default=42,
         help="Random seed for reproducible splits"
     )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=0,
+        help="Pack this many samples per tar shard in output/shards/ "
+             "instead of copying files (default: 0 = per-file layout)"
+    )
     return parser.parse_args()
 
 
@@ -103,7 +150,7 @@ def load_class_mapping(source_dir: Path) -> Dict[int, str]:
     yaml_path = source_dir / "data.yaml"
     if yaml_path.exists():
         with open(yaml_path, "r") as f:
-            data = yaml.safe_load(f)
+            data = yaml.load(f, Loader=SafeLoader)
             if "names" in data:
                 # Handle both dict and list formats
                 if isinstance(data["names"], dict):
@@ -127,6 +174,7 @@ def normalize_class_name(name: str) -> str:
     return name.lower().replace(" ", "_").replace("-", "_")
 
 
+@functools.lru_cache(maxsize=None)
 def find_unified_class_index(class_name: str) -> int:
     """
     Find the index of a class name in UNIFIED_CLASSES.
@@ -135,72 +183,116 @@ def find_unified_class_index(class_name: str) -> int:
     normalized = normalize_class_name(class_name)
     
     # Exact match
-    if normalized in UNIFIED_CLASSES:
-        return UNIFIED_CLASSES.index(normalized)
-    
-    # Fuzzy matching for common variations
-    mappings = {
-        "tank": ["main_battle_tank", "light_tank", "heavy_tank"],
-        "armored_vehicle": ["apc", "ifv", "armored_car", "armoured_vehicle"],
-        "fighter_jet": ["fighter", "jet_fighter", "combat_aircraft"],
-        "attack_helicopter": ["helicopter_gunship", "combat_helicopter"],
-        "military_truck": ["truck", "cargo_truck", "transport_truck"],
-        "military_personnel": ["soldier", "personnel", "troops"],
-        "warship": ["naval_vessel", "destroyer", "frigate", "cruiser"],
-        "patrol_boat": ["boat", "small_boat"],
-        "artillery": ["howitzer", "cannon", "field_gun"],
-        "missile_launcher": ["mlrs", "sam_launcher"],
-    }
+    index = _UNIFIED_INDEX.get(normalized)
+    if index is None:
+        index = _VARIATION_INDEX.get(normalized)
+    if index is not None:
+        return index
     
-    for unified_name, variations in mappings.items():
-        if normalized in variations or any(v in normalized for v in variations):
-            return UNIFIED_CLASSES.index(unified_name)
+    # Fuzzy matching: first variation contained in the name
+    for variation, index in _VARIATION_INDEX.items():
+        if variation in normalized:
+            return index
     
     return -1
 
 
+def build_class_remap(source_mapping: Dict[int, str]) -> Dict[int, int]:
+    """
+    Resolve every source class id to its UNIFIED_CLASSES index once per
+    dataset (-1 = unmapped), so label remapping is a dict lookup per line.
+    """
+    return {
+        class_id: find_unified_class_index(name)
+        for class_id, name in source_mapping.items()
+    }
+
+
+def remap_labels(data: bytes, class_remap: Dict[int, int]) -> bytes:
+    """
+    Remap class indices in YOLO label file contents using build_class_remap()
+    output; ids missing from it are treated as unmapped.
+    Returns the remapped contents, or b"" if no valid classes were found.
+    """
+    remapped_lines = []
+    
+    # Only the leading class id changes: one split validates the field
+    # count, and the bbox text is kept verbatim instead of re-joined
+    for line in data.splitlines():
+        line = line.strip()
+        parts = line.split()
+        if len(parts) < 5:  # class + 4 bbox values
+            continue
+        
+        old_class_id = int(parts[0])
+        new_class_id = class_remap.get(old_class_id, -1)
+        
+        if new_class_id == -1:
+            log.debug(f"Skipping unmapped class id: {old_class_id}")
+            continue
+        
+        remapped_lines.append(b"%d%s" % (new_class_id, line[len(parts[0]):]))
+    
+    return b"\n".join(remapped_lines) + b"\n" if remapped_lines else b""
+
+
 def remap_label_file(
     label_path: Path,
-    source_mapping: Dict[int, str],
+    class_remap: Dict[int, int],
     output_path: Path
 ) -> bool:
     """
-    Remap class indices in a YOLO label file.
+    Remap a YOLO label file into *output_path* (see remap_labels); the
+    output directory must already exist.
     Returns True if any valid classes were found, False otherwise.
     """
-    if not label_path.exists():
+    try:
+        remapped = remap_labels(label_path.read_bytes(), class_remap)
+    except FileNotFoundError:
         return False
     
-    remapped_lines = []
-    
-    with open(label_path, "r") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 5:
-                continue
-            
-            old_class_id = int(parts[0])
-            old_class_name = source_mapping.get(old_class_id, f"class_{old_class_id}")
-            
-            new_class_id = find_unified_class_index(old_class_name)
-            
-            if new_class_id == -1:
-                log.debug(f"Skipping unmapped class: {old_class_name}")
-                continue
-            
-            # Replace class ID, keep bbox coordinates
-            parts[0] = str(new_class_id)
-            remapped_lines.append(" ".join(parts))
-    
-    if remapped_lines:
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w") as f:
-            f.write("\n".join(remapped_lines) + "\n")
+    if remapped:
+        output_path.write_bytes(remapped)
         return True
     
     return False
 
 
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"})
+
+
+def _scan_one_dir(img_dir: Path) -> List[Tuple[Path, Path]]:
+    """
+    Recursively collect (image_path, label_path) pairs under *img_dir*.
+    os.scandir entries carry their type from readdir, so only the label
+    lookups need a stat.
+    """
+    pairs = []
+    stack = [str(img_dir)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                name = entry.name
+                dot = name.rfind(".")
+                if dot < 0 or name[dot:].lower() not in IMAGE_EXTENSIONS or not entry.is_file():
+                    continue
+                img_path = Path(entry.path)
+                # Find corresponding label
+                label_path = img_path.parent.parent / "labels" / img_path.stem
+                label_path = label_path.with_suffix(".txt")
+                
+                if not label_path.exists():
+                    # Try alternate structure
+                    label_path = img_path.parent.parent.parent / "labels" / img_path.parent.name / img_path.stem
+                    label_path = label_path.with_suffix(".txt")
+                
+                pairs.append((img_path, label_path))
+    return pairs
+
+
 def collect_dataset_files(source_dir: Path) -> List[Tuple[Path, Path]]:
     """
     Collect all image-label pairs from a source dataset.
@@ -218,31 +310,149 @@ def collect_dataset_files(source_dir: Path) -> List[Tuple[Path, Path]]:
         if img_dir.exists():
             image_dirs.append(img_dir)
     
-    for img_dir in image_dirs:
-        for img_path in img_dir.rglob("*"):
-            if img_path.suffix.lower() in [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"]:
-                # Find corresponding label
-                label_path = img_path.parent.parent / "labels" / img_path.stem
-                label_path = label_path.with_suffix(".txt")
-                
-                if not label_path.exists():
-                    # Try alternate structure
-                    label_path = img_path.parent.parent.parent / "labels" / img_path.parent.name / img_path.stem
-                    label_path = label_path.with_suffix(".txt")
-                
-                pairs.append((img_path, label_path))
+    # Directory walks are syscall-latency bound (NFS, spinning disks):
+    # scan the image dirs concurrently and concatenate in directory order
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        for dir_pairs in executor.map(_scan_one_dir, image_dirs):
+            pairs.extend(dir_pairs)
     
     return pairs
 
 
+def _fast_copy(src: Path, dst: Path, bufsize: int = 1 << 20):
+    """
+    Copy *src* to *dst*, then its metadata (like shutil.copy2).
+
+    Uses os.copy_file_range where the kernel supports it (reflink on
+    XFS/Btrfs, server-side copy on NFS); anything it doesn't copy goes
+    through a 1 MiB readinto loop rather than shutil's small buffer.
+    """
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except (AttributeError, OSError):
+            pass  # not Linux, or unsupported here: both offsets are where it stopped
+        
+        buf = bytearray(bufsize)
+        view = memoryview(buf)
+        while (n := fsrc.readinto(buf)):
+            fdst.write(view[:n])
+    shutil.copystat(src, dst)
+
+
+# Images written by previously merged sources, keyed by _content_key();
+# installed read-only in each pool worker by _init_worker
+_LINK_TARGETS: Dict[Tuple[int, int], Path] = {}
+
+
+def _init_worker(link_targets: Dict[Tuple[int, int], Path]):
+    global _LINK_TARGETS
+    _LINK_TARGETS = link_targets
+
+
+def _content_key(path: Path) -> Tuple[int, int]:
+    """Cheap duplicate-candidate key: (file size, CRC32 of the first 64 KiB)."""
+    with open(path, "rb") as f:
+        head = f.read(1 << 16)
+        size = os.fstat(f.fileno()).st_size
+    return size, zlib.crc32(head)
+
+
+def _place_image(img_path: Path, output_img_path: Path) -> Tuple[int, int]:
+    """
+    Put *img_path* at *output_img_path*: hard-link an identical image that an
+    earlier source already wrote (sources often share tiles), else copy.
+    Returns the image's _content_key().
+    """
+    key = _content_key(img_path)
+    existing = _LINK_TARGETS.get(key)
+    if existing is not None and filecmp.cmp(existing, img_path, shallow=False):
+        try:
+            os.link(existing, output_img_path)
+            return key
+        except OSError:
+            pass  # e.g. output already exists from an earlier run: copy over it
+    _fast_copy(img_path, output_img_path)
+    return key
+
+
+def _process_pair(task) -> Tuple[str, Optional[Tuple[int, int]]]:
+    """
+    ProcessPoolExecutor entry point: remap one label file and place its image.
+    Returns the split name the pair landed in (or "skipped") and the image's
+    content key (None when skipped).
+    """
+    img_path, label_path, class_remap, output_img_path, output_label_path, split_name = task
+    if remap_label_file(label_path, class_remap, output_label_path):
+        return split_name, _place_image(img_path, output_img_path)
+    return "skipped", None
+
+
+def _write_shards(tasks: list, shard_dir: Path, prefix: str, shard_size: int) -> Counter:
+    """
+    Pack the samples of *tasks* (as built in process_dataset) into tar
+    shards of *shard_size* samples per split, named
+    ``{split}-{prefix}-{shard:08d}.tar``; each sample is the image plus its
+    remapped ``.txt`` label under the same key. Appends one
+    ``{"shard": ..., "num_sequences": N}`` line per shard to manifest.jsonl.
+    Returns per-split counts (and "skipped").
+    """
+    outcomes = Counter()
+    manifest = []
+    
+    for split_name, split_tasks in groupby(tasks, key=itemgetter(5)):
+        shard_id, tar, n_samples = 0, None, 0
+        for img_path, label_path, class_remap, output_img_path, output_label_path, _ in split_tasks:
+            try:
+                labels = remap_labels(label_path.read_bytes(), class_remap)
+            except FileNotFoundError:
+                labels = b""
+            if not labels:
+                outcomes["skipped"] += 1
+                continue
+            
+            if tar is not None and n_samples == shard_size:
+                tar.close()
+                manifest.append({"shard": Path(tar.name).name, "num_sequences": n_samples})
+                shard_id, tar = shard_id + 1, None
+            if tar is None:
+                tar = tarfile.open(shard_dir / f"{split_name}-{prefix}-{shard_id:08d}.tar", "w")
+                n_samples = 0
+            
+            tar.add(img_path, arcname=output_img_path.name)
+            info = tarfile.TarInfo(output_label_path.name)
+            info.size = len(labels)
+            tar.addfile(info, BytesIO(labels))
+            n_samples += 1
+            outcomes[split_name] += 1
+        
+        if tar is not None:
+            tar.close()
+            manifest.append({"shard": Path(tar.name).name, "num_sequences": n_samples})
+    
+    with open(shard_dir / "manifest.jsonl", "a") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in manifest)
+    return outcomes
+
+
 def process_dataset(
     source_dir: Path,
     output_dir: Path,
     split_ratios: List[float],
-    seed: int
+    seed: int,
+    shard_size: int = 0,
+    link_targets: Optional[Dict[Tuple[int, int], Path]] = None
 ) -> Dict[str, int]:
     """
     Process a single source dataset and merge into output.
+    With *shard_size* > 0 samples are packed into output/shards/ tar files.
+    *link_targets* carries images written by earlier sources across calls so
+    duplicates are hard-linked; it is updated in place.
     Returns statistics dict.
     """
     log.info(f"Processing dataset: {source_dir}")
@@ -250,6 +460,7 @@ def process_dataset(
     # Load class mapping
     class_mapping = load_class_mapping(source_dir)
     log.info(f"Loaded {len(class_mapping)} classes from {source_dir}")
+    class_remap = build_class_remap(class_mapping)
     
     # Collect all image-label pairs
     pairs = collect_dataset_files(source_dir)
@@ -259,9 +470,10 @@ def process_dataset(
         log.warning(f"No valid pairs found in {source_dir}")
         return {"total": 0, "train": 0, "val": 0, "test": 0, "skipped": 0}
     
-    # Shuffle for random split
-    random.seed(seed)
-    random.shuffle(pairs)
+    # Shuffle for random split: a private RNG per source (no global state),
+    # so each source gets its own deterministic permutation
+    rng = random.Random(seed ^ zlib.crc32(source_dir.name.encode()))
+    rng.shuffle(pairs)
     
     # Calculate split indices
     n_total = len(pairs)
@@ -274,31 +486,51 @@ def process_dataset(
         "test": pairs[n_train + n_val:]
     }
     
-    stats = {"total": n_total, "train": 0, "val": 0, "test": 0, "skipped": 0}
-    
-    # Process each split
+    tasks = []
     for split_name, split_pairs in splits.items():
+        if not shard_size:
+            # Create the split's output dirs once, not per sample
+            (output_dir / "images" / split_name).mkdir(parents=True, exist_ok=True)
+            (output_dir / "labels" / split_name).mkdir(parents=True, exist_ok=True)
         for img_path, label_path in split_pairs:
-            # Generate unique filename
-            unique_name = f"{source_dir.name}_{img_path.stem}_{hash(str(img_path)) % 100000}"
+            # Generate unique filename (CRC32 of the source path: stable across runs)
+            unique_name = f"{source_dir.name}_{img_path.stem}_{zlib.crc32(str(img_path).encode()):08x}"
             
             output_img_path = output_dir / "images" / split_name / f"{unique_name}{img_path.suffix}"
             output_label_path = output_dir / "labels" / split_name / f"{unique_name}.txt"
-            
-            # Remap and write label
-            if remap_label_file(label_path, class_mapping, output_label_path):
-                # Copy image
-                output_img_path.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(img_path, output_img_path)
-                stats[split_name] += 1
-            else:
-                stats["skipped"] += 1
+            tasks.append((img_path, label_path, class_remap,
+                          output_img_path, output_label_path, split_name))
+    
+    if shard_size:
+        # Tar shards are written sequentially, so this stays in one process
+        shard_dir = output_dir / "shards"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        # Sources can share a basename (a/dota, b/dota); key shards by full path too
+        prefix = f"{source_dir.name}_{zlib.crc32(str(source_dir.resolve()).encode()):08x}"
+        outcomes = _write_shards(tasks, shard_dir, prefix, shard_size)
+    else:
+        # Pairs are independent: remap + copy them across all cores
+        if link_targets is None:
+            link_targets = {}
+        outcomes = Counter()
+        new_targets = {}
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(link_targets,)) as executor:
+            results = executor.map(_process_pair, tasks, chunksize=64)
+            for task, (outcome, key) in zip(tasks, results):
+                outcomes[outcome] += 1
+                if key is not None:
+                    new_targets.setdefault(key, task[3])
+        for key, path in new_targets.items():
+            link_targets.setdefault(key, path)
+    
+    stats = {"total": n_total, "train": 0, "val": 0, "test": 0, "skipped": 0}
+    stats.update(outcomes)
     
     log.info(f"Processed {source_dir.name}: train={stats['train']}, val={stats['val']}, test={stats['test']}, skipped={stats['skipped']}")
     return stats
 
 
-def write_data_yaml(output_dir: Path):
+def write_data_yaml(output_dir: Path, sharded: bool = False):
     """Write the YOLO data.yaml configuration file."""
     data = {
         "path": str(output_dir.absolute()),
@@ -306,12 +538,15 @@ def write_data_yaml(output_dir: Path):
         "val": "images/val",
         "test": "images/test",
         "nc": len(UNIFIED_CLASSES),
-        "names": {i: name for i, name in enumerate(UNIFIED_CLASSES)}
+        "names": UNIFIED_CLASSES
     }
+    if sharded:
+        data["shards"] = "shards"
+        data["manifest"] = "shards/manifest.jsonl"
     
     yaml_path = output_dir / "military.yaml"
     with open(yaml_path, "w") as f:
-        yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(data, f, Dumper=SafeDumper, default_flow_style=False, sort_keys=False)
     
     log.info(f"Written data config to {yaml_path}")
 
@@ -333,10 +568,15 @@ def main():
     log.info(f"Output directory: {output_dir}")
     log.info(f"Split ratios: train={args.split[0]}, val={args.split[1]}, test={args.split[2]}")
     log.info(f"Unified classes: {len(UNIFIED_CLASSES)}")
+    if args.shard_size:
+        log.info(f"Output format: tar shards of {args.shard_size} samples")
+        # The manifest is appended per source; start it fresh for this run
+        (output_dir / "shards" / "manifest.jsonl").unlink(missing_ok=True)
     log.info("=" * 60)
     
     # Process each source dataset
     total_stats = {"total": 0, "train": 0, "val": 0, "test": 0, "skipped": 0}
+    link_targets = {}  # images already written, for hard-linking duplicates
     
     for source in args.sources:
         source_path = Path(source)
@@ -344,12 +584,13 @@ def main():
             log.warning(f"Source directory not found: {source_path}")
             continue
         
-        stats = process_dataset(source_path, output_dir, args.split, args.seed)
+        stats = process_dataset(source_path, output_dir, args.split, args.seed,
+                                args.shard_size, link_targets)
         for key in total_stats:
             total_stats[key] += stats[key]
     
     # Write data.yaml
-    write_data_yaml(output_dir)
+    write_data_yaml(output_dir, sharded=args.shard_size > 0)
     
     # Summary
     log.info("=" * 60)
@@ -7,6 +7,10 @@ Converts a list of raw detection dicts (from detection.py) into a structured
 threat report that the frontend can render without any additional computation.
 """
 
+from collections import Counter
+
+import numpy as np
+
 from config import HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES
 
 
@@ -45,14 +49,28 @@ THREAT_LEVELS = {
     },
 }
 
+# check_threat() response fields that depend only on the level
+_RESPONSE_TEMPLATES = {
+    level: {
+        "threat_level": level,
+        "label":        meta["label"],
+        "description":  meta["description"],
+        "color":        meta["color"],
+        "icon":         meta["icon"],
+    }
+    for level, meta in THREAT_LEVELS.items()
+}
+
 
-def check_threat(detections: list) -> dict:
+def check_threat(detections: list, soa: dict = None) -> dict:
     """
     Evaluate a list of detection dicts and return a threat assessment report.
 
     Parameters
     ----------
     detections : list of dicts produced by detection.run_detection()
+    soa        : optional ``detections_soa`` arrays for the same detections;
+                 when given, counts are computed with vectorised NumPy ops
 
     Returns
     -------
@@ -65,51 +83,79 @@ def check_threat(detections: list) -> dict:
         high_risk_hits – list of class names that triggered high-risk flag
         stats          – summary counts
     """
+    if soa is not None:
+        return _check_threat_soa(soa)
+
     if not detections:
-        level = "CLEAR"
-        high_risk_hits = []
+        return _report("CLEAR", [], _compute_stats([]))
+
+    high_risk_hits, stats = _compute_stats(detections, collect_high=True)
+    high_count   = stats["high_risk"]
+    medium_count = stats["medium_risk"]
+
+    if high_count >= 2:
+        level = "CRITICAL"
+    elif high_count == 1:
+        level = "HIGH"
+    elif medium_count >= 2:
+        level = "ELEVATED"
     else:
-        high_risk_hits = [
-            d["class_name"]
-            for d in detections
-            if d["risk_level"] == "high"
-        ]
-        medium_hits = [
-            d["class_name"]
-            for d in detections
-            if d["risk_level"] == "medium"
-        ]
-
-        high_count   = len(high_risk_hits)
-        medium_count = len(medium_hits)
-
-        if high_count >= 2:
-            level = "CRITICAL"
-        elif high_count == 1:
-            level = "HIGH"
-        elif medium_count >= 2:
-            level = "ELEVATED"
-        else:
-            level = "LOW"
-
-    stats = _compute_stats(detections)
-    meta  = THREAT_LEVELS[level]
-
-    return {
-        "threat_level":   level,
-        "label":          meta["label"],
-        "description":    meta["description"],
-        "color":          meta["color"],
-        "icon":           meta["icon"],
-        "high_risk_hits": high_risk_hits,
-        "stats":          stats,
+        level = "LOW"
+
+    return _report(level, high_risk_hits, stats)
+
+
+def _check_threat_soa(soa: dict) -> dict:
+    """check_threat() over the struct-of-arrays form of the detections."""
+    risk = soa["risk"]
+    if risk.size == 0:
+        return _report("CLEAR", [], _compute_stats([]))
+
+    high_risk_hits = soa["cls"][risk == "high"].tolist()
+    high_count     = len(high_risk_hits)
+    medium_count   = int(np.count_nonzero(risk == "medium"))
+
+    if high_count >= 2:
+        level = "CRITICAL"
+    elif high_count == 1:
+        level = "HIGH"
+    elif medium_count >= 2:
+        level = "ELEVATED"
+    else:
+        level = "LOW"
+
+    confs = soa["conf"].astype(np.float64)
+    stats = {
+        "total":          int(risk.size),
+        "high_risk":      high_count,
+        "medium_risk":    medium_count,
+        "low_risk":       int(risk.size) - high_count - medium_count,
+        "avg_confidence": round(float(confs.mean()), 4),
+        "max_confidence": round(float(confs.max()), 4),
+        # Counter beats np.unique's sort at MAX_DETECTIONS-sized inputs
+        "class_counts":   dict(Counter(soa["cls"].tolist())),
     }
 
+    return _report(level, high_risk_hits, stats)
+
+
+def _report(level: str, high_risk_hits: list, stats: dict) -> dict:
+    """Assemble the check_threat() response for *level*."""
+    report = _RESPONSE_TEMPLATES[level].copy()
+    report["high_risk_hits"] = high_risk_hits
+    report["stats"]          = stats
+    return report
+
 
-def _compute_stats(detections: list) -> dict:
-    """Aggregate counts and confidence stats from detections."""
+def _compute_stats(detections: list, collect_high: bool = False):
+    """
+    Aggregate counts and confidence stats from detections in a single pass.
+
+    With *collect_high*, returns ``(high_risk_hits, stats)`` — the class names
+    of high-risk detections are gathered in the same loop.
+    """
     if not detections:
-        return {
+        stats = {
             "total":         0,
             "high_risk":     0,
             "medium_risk":   0,
@@ -118,21 +164,34 @@ def _compute_stats(detections: list) -> dict:
             "max_confidence": 0.0,
             "class_counts":  {},
         }
+        return ([], stats) if collect_high else stats
 
-    confs = [d["confidence"] for d in detections]
+    high_risk_hits = []
     class_counts: dict[str, int] = {}
     risk_counts   = {"high": 0, "medium": 0, "low": 0}
+    conf_sum      = 0.0
+    conf_max      = float("-inf")
 
     for d in detections:
-        class_counts[d["class_name"]] = class_counts.get(d["class_name"], 0) + 1
-        risk_counts[d["risk_level"]] += 1
-
-    return {
+        class_name = d["class_name"]
+        risk_level = d["risk_level"]
+        conf       = d["confidence"]
+
+        class_counts[class_name] = class_counts.get(class_name, 0) + 1
+        risk_counts[risk_level] += 1
+        if risk_level == "high":
+            high_risk_hits.append(class_name)
+        conf_sum += conf
+        if conf > conf_max:
+            conf_max = conf
+
+    stats = {
         "total":          len(detections),
         "high_risk":      risk_counts["high"],
         "medium_risk":    risk_counts["medium"],
         "low_risk":       risk_counts["low"],
-        "avg_confidence": round(sum(confs) / len(confs), 4),
-        "max_confidence": round(max(confs), 4),
+        "avg_confidence": round(conf_sum / len(detections), 4),
+        "max_confidence": round(conf_max, 4),
         "class_counts":   class_counts,
     }
+    return (high_risk_hits, stats) if collect_high else stats
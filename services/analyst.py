@@ -9,8 +9,13 @@ and provides interactive chat for follow-up questions.
 Supports: OpenRouter, Groq, Gemini, Anthropic, OpenAI
 """
 
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import config
 from services.llm_client import get_llm_client
@@ -55,8 +60,57 @@ SYSTEM_PROMPT = """You are an AI Tactical Analyst embedded in AEGIS, a military
 Remember: You are analyzing a single image scan. You do not have historical context unless explicitly provided. Focus on what is visible in THIS scan."""
 
 
+# ── Response Cache ────────────────────────────────────────────────────────────
+# Identical detection output yields an equivalent SITREP, so generated text is
+# memoised by a digest of the prompt. Only successful responses are cached,
+# and entries expire after LLM_CACHE_TTL_S so answers are eventually redrawn.
+
+_CACHE: "OrderedDict[Tuple, Tuple[float, Dict]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+# Inference time differs on every run of the same image; leave it out of keys
+_INFERENCE_LINE = re.compile(r"^Inference time: .*$", re.MULTILINE)
+
+
+def _cache_key(kind: str, *parts: str) -> Tuple:
+    """Key on model + a BLAKE2b digest of the prompt parts (not security-relevant)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return (kind, config.LLM_PROVIDER, config.LLM_MODEL, h.digest())
+
+
+def _cache_get(key: Tuple) -> Optional[Dict]:
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if time.monotonic() >= expires:
+            del _CACHE[key]
+            return None
+        _CACHE.move_to_end(key)
+        return response
+
+
+def _cache_put(key: Tuple, response: Dict) -> None:
+    with _CACHE_LOCK:
+        _CACHE[key] = (time.monotonic() + config.LLM_CACHE_TTL_S, response)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > config.LLM_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
 # ── Helper Functions ──────────────────────────────────────────────────────────
 
+# Frame position names, indexed [row][column] (top/middle/bottom × left/center/right)
+_POSITIONS = (
+    ("top-left",    "top-center",    "top-right"),
+    ("middle-left", "center",        "middle-right"),
+    ("bottom-left", "bottom-center", "bottom-right"),
+)
+
 def build_detection_context(detection_data: Dict) -> str:
     """
     Convert detection JSON into a compact, LLM-readable string.
@@ -72,28 +126,31 @@ def build_detection_context(detection_data: Dict) -> str:
     image_size = detection_data.get("image_size", {})
     inference_ms = detection_data.get("inference_ms", 0)
     
-    # Build context string
-    lines = []
-    lines.append(f"IMAGE SCAN ANALYSIS")
-    lines.append(f"Resolution: {image_size.get('width', 0)}×{image_size.get('height', 0)} pixels")
-    lines.append(f"Inference time: {inference_ms}ms")
-    lines.append(f"")
-    
-    # Threat assessment
-    lines.append(f"THREAT ASSESSMENT:")
-    lines.append(f"  Level: {threat.get('threat_level', 'UNKNOWN')}")
-    lines.append(f"  Label: {threat.get('label', 'N/A')}")
-    lines.append(f"  Description: {threat.get('description', 'N/A')}")
-    
+    # Header and threat assessment
     stats = threat.get('stats', {})
-    lines.append(f"  Total detections: {stats.get('total', 0)}")
-    lines.append(f"  High-risk: {stats.get('high_risk', 0)}")
-    lines.append(f"  Medium-risk: {stats.get('medium_risk', 0)}")
-    lines.append(f"  Low-risk: {stats.get('low_risk', 0)}")
-    lines.append(f"")
+    lines = [
+        f"IMAGE SCAN ANALYSIS\n"
+        f"Resolution: {image_size.get('width', 0)}×{image_size.get('height', 0)} pixels\n"
+        f"Inference time: {inference_ms}ms\n"
+        f"\n"
+        f"THREAT ASSESSMENT:\n"
+        f"  Level: {threat.get('threat_level', 'UNKNOWN')}\n"
+        f"  Label: {threat.get('label', 'N/A')}\n"
+        f"  Description: {threat.get('description', 'N/A')}\n"
+        f"  Total detections: {stats.get('total', 0)}\n"
+        f"  High-risk: {stats.get('high_risk', 0)}\n"
+        f"  Medium-risk: {stats.get('medium_risk', 0)}\n"
+        f"  Low-risk: {stats.get('low_risk', 0)}\n"
+    ]
     
     # Individual detections
     if detections:
+        # Thirds of the frame; a centre exactly on a boundary counts as middle
+        img_w = image_size.get('width', 1)
+        img_h = image_size.get('height', 1)
+        left, right  = img_w * 0.33, img_w * 0.67
+        top, bottom  = img_h * 0.33, img_h * 0.67
+        
         lines.append(f"DETECTED OBJECTS ({len(detections)} total):")
         for i, det in enumerate(detections, 1):
             class_name = det.get('class_name', 'unknown')
@@ -104,18 +161,17 @@ def build_detection_context(detection_data: Dict) -> str:
             # Approximate position description
             cx = box.get('cx', 0)
             cy = box.get('cy', 0)
-            img_w = image_size.get('width', 1)
-            img_h = image_size.get('height', 1)
-            
-            # Determine position (left/center/right, top/center/bottom)
-            h_pos = "left" if cx < img_w * 0.33 else "right" if cx > img_w * 0.67 else "center"
-            v_pos = "top" if cy < img_h * 0.33 else "bottom" if cy > img_h * 0.67 else "middle"
-            position = f"{v_pos}-{h_pos}" if v_pos != "middle" or h_pos != "center" else "center"
+            col = 0 if cx < left else 2 if cx > right else 1
+            row = 0 if cy < top else 2 if cy > bottom else 1
+            position = _POSITIONS[row][col]
             
-            lines.append(f"  {i}. {class_name.upper()} [{risk} RISK]")
-            lines.append(f"     Confidence: {confidence:.1f}%")
-            lines.append(f"     Position: {position} of frame")
-            lines.append(f"     Size: {box.get('width', 0)}×{box.get('height', 0)} pixels")
+            # One string per detection: 4 lines
+            lines.append(
+                f"  {i}. {class_name.upper()} [{risk} RISK]\n"
+                f"     Confidence: {confidence:.1f}%\n"
+                f"     Position: {position} of frame\n"
+                f"     Size: {box.get('width', 0)}×{box.get('height', 0)} pixels"
+            )
     else:
         lines.append(f"DETECTED OBJECTS: None")
     
@@ -135,6 +191,7 @@ def generate_sitrep(detection_data: Dict) -> Dict:
             - sitrep: str (the generated report)
             - model: str (model used)
             - tokens: int (tokens used)
+            - context: str (build_detection_context() output, if success=True)
             - error: str (if success=False)
     """
     if not config.ANALYST_ENABLED:
@@ -150,6 +207,19 @@ def generate_sitrep(detection_data: Dict) -> Dict:
         # Build detection context
         context = build_detection_context(detection_data)
         
+        key = _cache_key("sitrep", _INFERENCE_LINE.sub("", context))
+        cached = _cache_get(key)
+        if cached is not None:
+            logger.info("SITREP served from cache")
+            return {
+                "success": True,
+                "sitrep": cached["text"],
+                "model": cached["model"],
+                "tokens": 0,
+                "context": context,
+                "error": ""
+            }
+        
         # Get LLM client
         client = get_llm_client()
         
@@ -160,6 +230,7 @@ def generate_sitrep(detection_data: Dict) -> Dict:
             system_prompt=SYSTEM_PROMPT,
             user_message=f"Generate a tactical SITREP for this detection scan:\n\n{context}"
         )
+        _cache_put(key, response)
         
         logger.info(f"SITREP generated successfully ({response['tokens_used']} tokens)")
         
@@ -168,6 +239,7 @@ def generate_sitrep(detection_data: Dict) -> Dict:
             "sitrep": response["text"],
             "model": response["model"],
             "tokens": response["tokens_used"],
+            "context": context,
             "error": ""
         }
         
@@ -182,6 +254,28 @@ def generate_sitrep(detection_data: Dict) -> Dict:
         }
 
 
+def _chat_system_prompt(scan_id: str, detection_context: str, sitrep: str) -> str:
+    """SYSTEM_PROMPT extended with one scan's context and SITREP."""
+    return f"""{SYSTEM_PROMPT}
+
+**CURRENT SCAN CONTEXT (Scan ID: {scan_id}):**
+
+{detection_context}
+
+**PREVIOUSLY GENERATED SITREP:**
+{sitrep}
+
+The operator is now asking follow-up questions about this specific scan. Answer based on the detection data above. Be concise and tactical."""
+
+
+def _chat_cache_key(system_prompt: str, user_message: str,
+                    chat_history: List[Dict]) -> Tuple:
+    return _cache_key(
+        "chat", system_prompt, user_message,
+        *(f"{m.get('role')}:{m.get('content')}" for m in chat_history or ()),
+    )
+
+
 def analyst_chat(scan_id: str, user_message: str, detection_context: str, 
                  sitrep: str, chat_history: List[Dict]) -> Dict:
     """
@@ -214,25 +308,28 @@ def analyst_chat(scan_id: str, user_message: str, detection_context: str,
         client = get_llm_client()
         
         # Build enhanced system prompt with scan context
-        enhanced_system = f"""{SYSTEM_PROMPT}
-
-**CURRENT SCAN CONTEXT (Scan ID: {scan_id}):**
-
-{detection_context}
-
-**PREVIOUSLY GENERATED SITREP:**
-{sitrep}
-
-The operator is now asking follow-up questions about this specific scan. Answer based on the detection data above. Be concise and tactical."""
+        enhanced_system = _chat_system_prompt(scan_id, detection_context, sitrep)
         
         logger.info(f"Processing chat question for scan {scan_id}...")
         
+        key = _chat_cache_key(enhanced_system, user_message, chat_history)
+        cached = _cache_get(key)
+        if cached is not None:
+            logger.info("Chat response served from cache")
+            return {
+                "success": True,
+                "answer": cached["text"],
+                "tokens": 0,
+                "error": ""
+            }
+        
         # Generate response
         response = client.generate(
             system_prompt=enhanced_system,
             user_message=user_message,
             messages=chat_history
         )
+        _cache_put(key, response)
         
         logger.info(f"Chat response generated ({response['tokens_used']} tokens)")
         
@@ -251,3 +348,40 @@ The operator is now asking follow-up questions about this specific scan. Answer
             "answer": "",
             "tokens": 0
         }
+
+
+def analyst_chat_stream(scan_id: str, user_message: str, detection_context: str,
+                        sitrep: str, chat_history: List[Dict]) -> Iterator[str]:
+    """
+    Streaming variant of analyst_chat(): yield the answer in text chunks as
+    the provider produces them, so the operator sees the first words after
+    one token of latency instead of the whole reply.
+    
+    Provider deltas are coalesced into ~CHAT_STREAM_FLUSH_MS windows to keep
+    the number of network writes down. Errors propagate to the caller; the
+    check for ANALYST_ENABLED is also left to the caller.
+    """
+    enhanced_system = _chat_system_prompt(scan_id, detection_context, sitrep)
+    key = _chat_cache_key(enhanced_system, user_message, chat_history)
+    cached = _cache_get(key)
+    if cached is not None:
+        logger.info("Chat response served from cache")
+        yield cached["text"]
+        return
+    
+    logger.info(f"Streaming chat answer for scan {scan_id}...")
+    client = get_llm_client()
+    flush_every = config.CHAT_STREAM_FLUSH_MS / 1000
+    parts, pending = [], []
+    deadline = time.monotonic() + flush_every
+    for delta in client.stream(enhanced_system, user_message, chat_history):
+        parts.append(delta)
+        pending.append(delta)
+        if time.monotonic() >= deadline:
+            yield "".join(pending)
+            pending.clear()
+            deadline = time.monotonic() + flush_every
+    if pending:
+        yield "".join(pending)
+    
+    _cache_put(key, {"text": "".join(parts), "model": client.model, "tokens_used": 0})
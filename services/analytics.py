@@ -3,25 +3,41 @@ services/analytics.py
 ---------------------
 Dashboard analytics computation from detection logs.
 
-Reads logs/detections.csv and computes aggregated statistics for the
-Intelligence Dashboard at /dashboard.
+Aggregates the SQLite detection log (services/db.py) in SQL for the
+Intelligence Dashboard at /dashboard, so a refresh costs a handful of
+indexed queries instead of re-parsing the whole history.
 """
 
-import os
 import logging
+import sqlite3
+import threading
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
+from functools import lru_cache
 
-import pandas as pd
-
-from config import LOG_PATH, HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES
+from config import HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES
+from services.db import COLUMNS, get_connection
 
 logger = logging.getLogger(__name__)
 
+_DAYS_SHORT = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']  # strftime('%w') order
+_CONF_BINS  = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+_BIN_LABELS = [f"{_CONF_BINS[i]:.1f}-{_CONF_BINS[i+1]:.1f}" for i in range(len(_CONF_BINS) - 1)]
+
+# Right-closed bins with the first bin including its lower edge (pd.cut semantics)
+_CONF_BIN_SQL = "CASE " + " ".join(
+    f"WHEN confidence <= {upper} THEN {i}" for i, upper in enumerate(_CONF_BINS[1:])
+) + " END"
+
+
+# Last result, keyed on (newest row id, today's date): the log is append-only,
+# so an unchanged max(id) on the same day means identical analytics
+_DASH_CACHE = {"key": None, "value": None}
+_DASH_LOCK  = threading.Lock()
+
 
 def compute_dashboard_data() -> dict:
     """
-    Compute all dashboard analytics from the detection log CSV.
+    Compute all dashboard analytics from the detection log.
     
     Returns a dict with keys:
         - summary: total scans, detections, critical today, most detected class
@@ -31,44 +47,47 @@ def compute_dashboard_data() -> dict:
         - hourly_heatmap: 7x24 grid of detection counts by day/hour
         - confidence_histogram: 10 bins of confidence distribution
         - recent_rows: last 25 detection rows
+
+    The result is cached until a new row is logged or the date changes;
+    callers must not mutate it.
     """
-    
-    # Handle missing or empty CSV
-    if not os.path.exists(LOG_PATH) or os.path.getsize(LOG_PATH) == 0:
-        return _empty_dashboard_data()
-    
     try:
-        df = pd.read_csv(LOG_PATH)
-    except Exception as exc:
-        logger.error("Failed to read CSV: %s", exc)
+        conn = get_connection()
+        key = (conn.execute("SELECT MAX(id) FROM detections").fetchone()[0],
+               datetime.now().date())
+        with _DASH_LOCK:
+            if key == _DASH_CACHE["key"]:
+                return _DASH_CACHE["value"]
+            value = _compute(conn)
+            _DASH_CACHE["key"], _DASH_CACHE["value"] = key, value
+            return value
+    except sqlite3.Error as exc:
+        logger.error("Failed to query detection log: %s", exc)
         return _empty_dashboard_data()
-    
-    if df.empty:
-        return _empty_dashboard_data()
-    
-    # Parse timestamps
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-    df = df.dropna(subset=['timestamp'])
-    
-    if df.empty:
-        return _empty_dashboard_data()
-    
-    # Filter out NONE detections for most calculations
-    df_real = df[df['class_name'] != 'NONE'].copy()
-    
-    # ── Summary stats ──────────────────────────────────────────────────
-    total_scans = df['image_filename'].nunique()
-    total_detections = len(df_real)
-    
+
+
+def _compute(conn: sqlite3.Connection) -> dict:
+    # Most calculations exclude the placeholder 'NONE' rows
+    real = "class_name != 'NONE'"
     today = datetime.now().date()
-    critical_today = len(df[(df['threat_level'] == 'CRITICAL') & 
-                             (df['timestamp'].dt.date == today)])
-    
-    if len(df_real) > 0:
-        most_detected = df_real['class_name'].value_counts().index[0]
-    else:
-        most_detected = "None"
-    
+
+    # ── Summary stats (one table scan for all four counts) ─────────────
+    total_scans, total_rows, total_detections, critical_today = conn.execute(
+        f"SELECT COUNT(DISTINCT image_filename), COUNT(*), "
+        f"COALESCE(SUM({real}), 0), "
+        f"COALESCE(SUM(threat_level = 'CRITICAL' AND substr(timestamp, 1, 10) = ?), 0) "
+        f"FROM detections",
+        (today.isoformat(),),
+    ).fetchone()
+    if total_rows == 0:
+        return _empty_dashboard_data()
+
+    class_counts = conn.execute(
+        f"SELECT class_name, COUNT(*) AS n FROM detections WHERE {real} "
+        "GROUP BY class_name ORDER BY n DESC LIMIT 10"
+    ).fetchall()
+    most_detected = class_counts[0][0] if class_counts else "None"
+
     summary = {
         "total_scans": int(total_scans),
         "total_detections": int(total_detections),
@@ -76,87 +95,73 @@ def compute_dashboard_data() -> dict:
         "most_detected_class": most_detected
     }
     
-    # ── Threat distribution ────────────────────────────────────────────
-    threat_counts = df.groupby('image_filename')['threat_level'].first().value_counts()
+    # ── Threat distribution (one threat level per scan) ────────────────
+    # MIN(id) makes SQLite take threat_level from each scan's first row;
+    # everything is read from the covering (image, threat) index
+    threat_counts = dict(conn.execute(
+        "SELECT threat_level, COUNT(*) FROM "
+        "(SELECT threat_level, MIN(id) FROM detections GROUP BY image_filename) "
+        "GROUP BY threat_level"
+    ).fetchall())
     threat_distribution = {
-        "CRITICAL": int(threat_counts.get("CRITICAL", 0)),
-        "HIGH": int(threat_counts.get("HIGH", 0)),
-        "ELEVATED": int(threat_counts.get("ELEVATED", 0)),
-        "LOW": int(threat_counts.get("LOW", 0)),
-        "CLEAR": int(threat_counts.get("CLEAR", 0))
+        level: int(threat_counts.get(level, 0))
+        for level in ("CRITICAL", "HIGH", "ELEVATED", "LOW", "CLEAR")
     }
     
     # ── Detections over time (last 30 days) ────────────────────────────
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=29)
-    
-    date_range = pd.date_range(start=start_date.date(), end=end_date.date(), freq='D')
-    daily_counts = df_real.groupby(df_real['timestamp'].dt.date).size()
-    
+    start_date = today - timedelta(days=29)
+    daily_counts = dict(conn.execute(
+        f"SELECT substr(timestamp, 1, 10) AS day, COUNT(*) FROM detections "
+        f"WHERE {real} AND timestamp >= ? GROUP BY day",
+        (start_date.isoformat(),),
+    ).fetchall())
+
     detections_over_time = []
-    for date in date_range:
-        count = int(daily_counts.get(date.date(), 0))
+    for offset in range(30):
+        date = (start_date + timedelta(days=offset)).isoformat()
         detections_over_time.append({
-            "date": date.strftime("%Y-%m-%d"),
-            "count": count
+            "date": date,
+            "count": int(daily_counts.get(date, 0))
         })
     
     # ── Top 10 classes ─────────────────────────────────────────────────
-    class_counts = df_real['class_name'].value_counts().head(10)
     top_classes = []
-    for class_name, count in class_counts.items():
-        risk = _get_risk_level(class_name)
+    for class_name, count in class_counts:
         top_classes.append({
             "class_name": class_name,
             "count": int(count),
-            "risk": risk
+            "risk": _get_risk_level(class_name)
         })
     
     # ── Hourly heatmap (day of week x hour) ────────────────────────────
-    df_real['day_of_week'] = df_real['timestamp'].dt.day_name()
-    df_real['hour'] = df_real['timestamp'].dt.hour
-    
-    heatmap_data = df_real.groupby(['day_of_week', 'hour']).size()
-    
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    hourly_heatmap = {}
-    
-    for day in days_order:
-        day_short = day[:3]
-        hourly_heatmap[day_short] = {}
-        for hour in range(24):
-            count = int(heatmap_data.get((day, hour), 0))
-            hourly_heatmap[day_short][hour] = count
+    hourly_heatmap = {
+        day: {hour: 0 for hour in range(24)}
+        for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    }
+    for weekday, hour, count in conn.execute(
+        f"SELECT CAST(strftime('%w', timestamp) AS INTEGER) AS dow, "
+        f"CAST(strftime('%H', timestamp) AS INTEGER) AS hour, COUNT(*) "
+        f"FROM detections WHERE {real} GROUP BY dow, hour"
+    ):
+        if weekday is not None:
+            hourly_heatmap[_DAYS_SHORT[weekday]][hour] = int(count)
     
     # ── Confidence histogram ───────────────────────────────────────────
-    if len(df_real) > 0:
-        df_real['confidence'] = pd.to_numeric(df_real['confidence'], errors='coerce')
-        df_real = df_real.dropna(subset=['confidence'])
-        
-        bins = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
-        bin_labels = [f"{bins[i]:.1f}-{bins[i+1]:.1f}" for i in range(len(bins)-1)]
-        
-        df_real['conf_bin'] = pd.cut(df_real['confidence'], bins=bins, labels=bin_labels, include_lowest=True)
-        conf_counts = df_real['conf_bin'].value_counts().sort_index()
-        
-        confidence_histogram = []
-        for bin_label in bin_labels:
-            count = int(conf_counts.get(bin_label, 0))
-            confidence_histogram.append({
-                "bin": bin_label,
-                "count": count
-            })
-    else:
-        confidence_histogram = [{"bin": f"{i/10:.1f}-{(i+1)/10:.1f}", "count": 0} for i in range(10)]
+    conf_counts = dict(conn.execute(
+        f"SELECT {_CONF_BIN_SQL} AS bin, COUNT(*) FROM detections "
+        f"WHERE {real} AND confidence >= 0 AND confidence <= 1 GROUP BY bin"
+    ).fetchall())
+    confidence_histogram = [
+        {"bin": label, "count": int(conf_counts.get(i, 0))}
+        for i, label in enumerate(_BIN_LABELS)
+    ]
     
     # ── Recent rows (last 25) ──────────────────────────────────────────
-    recent_df = df.tail(25).sort_values('timestamp', ascending=False)
-    recent_rows = recent_df.to_dict('records')
-    
-    # Convert timestamps to strings
-    for row in recent_rows:
-        if isinstance(row.get('timestamp'), pd.Timestamp):
-            row['timestamp'] = row['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+    recent = conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM detections ORDER BY id DESC LIMIT 25"
+    ).fetchall()
+    recent_rows = sorted((dict(row) for row in recent),
+                         key=lambda row: row["timestamp"], reverse=True)
     
     return {
         "summary": summary,
@@ -169,6 +174,7 @@ def compute_dashboard_data() -> dict:
     }
 
 
+@lru_cache(maxsize=None)   # risk sets are fixed per process
 def _get_risk_level(class_name: str) -> str:
     """Determine risk level for a class name."""
     name = class_name.lower().replace(" ", "_")
@@ -0,0 +1,88 @@
+"""
+services/batcher.py
+-------------------
+Dynamic micro-batching for concurrent /detect requests.
+
+Design choices
+--------------
+* Request threads only enqueue work and wait on a Future; a single daemon
+  worker owns the model, so GPU access is never contended.
+* The worker blocks for the first request, then keeps draining the queue until
+  either ``max_batch`` requests are collected or ``max_wait_ms`` elapses.
+  An idle server therefore adds at most ``max_wait_ms`` of latency.
+* If a batch fails (e.g. one unreadable upload) its requests are retried one
+  by one so a single bad image cannot fail its neighbours.
+"""
+
+import queue
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from services.detection import run_detection_batch
+
+logger = logging.getLogger(__name__)
+
+
+class DynamicBatcher:
+    """Collect concurrent inference requests into one batched model call."""
+
+    def __init__(self, model, max_batch: int = 16, max_wait_ms: float = 8):
+        self.model       = model
+        self.max_batch   = max(1, int(max_batch))
+        self.max_wait_s  = max_wait_ms / 1000.0
+        self._queue      = queue.Queue()
+        self._thread     = threading.Thread(
+            target=self._worker, name="detect-batcher", daemon=True,
+        )
+        self._thread.start()
+
+    def submit(self, image_path: str) -> Future:
+        """Queue *image_path* for inference; resolve with a run_detection dict."""
+        future = Future()
+        self._queue.put((image_path, future))
+        return future
+
+    # ── Worker ────────────────────────────────────────────────────────────────
+
+    def _collect(self) -> list:
+        """Block for one request, then gather more until full or timed out."""
+        batch    = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            paths = [path for path, _ in batch]
+
+            try:
+                results = run_detection_batch(self.model, paths)
+            except Exception:
+                if len(batch) > 1:
+                    logger.warning("Batch of %d failed — retrying individually", len(batch))
+                self._run_individually(batch)
+                continue
+
+            if len(batch) > 1:
+                logger.info("Batched inference | %d images", len(batch))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_individually(self, batch: list):
+        for path, future in batch:
+            try:
+                future.set_result(run_detection_batch(self.model, [path])[0])
+            except Exception as exc:
+                future.set_exception(exc)
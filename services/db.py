@@ -0,0 +1,126 @@
+"""
+services/db.py
+--------------
+SQLite storage for the detection event log.
+
+Design choices
+--------------
+* WAL journal mode: dashboard and /logs readers never block the writer
+  (post-detection logging runs on a background thread pool).
+* One connection per thread (``threading.local``) — SQLite connections must
+  not be used concurrently, and per-thread connections let WAL readers run
+  in parallel instead of queueing on a shared lock.
+* The schema keeps the original CSV column names, so rows returned to the
+  frontend have the same keys as before.
+* An existing logs/detections.csv is imported once when the table is created.
+"""
+
+import csv
+import os
+import sqlite3
+import logging
+import threading
+
+from config import LOG_DB_PATH, LOG_PATH
+
+logger = logging.getLogger(__name__)
+
+# Column name → SQLite type, in CSV order
+COLUMNS = {
+    "timestamp":        "TEXT",
+    "image_filename":   "TEXT",
+    "threat_level":     "TEXT",
+    "total_detections": "INTEGER",
+    "high_risk_count":  "INTEGER",
+    "class_name":       "TEXT",
+    "confidence":       "REAL",
+    "risk_level":       "TEXT",
+    "box_x1":           "INTEGER",
+    "box_y1":           "INTEGER",
+    "box_x2":           "INTEGER",
+    "box_y2":           "INTEGER",
+    "inference_ms":     "REAL",
+}
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS detections ("
+    "id INTEGER PRIMARY KEY, "
+    + ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+    + ")"
+)
+_INDEXES = (
+    # (image, threat level) covers the per-scan threat distribution query;
+    # it replaces the earlier image-only index
+    "DROP INDEX IF EXISTS idx_detections_image",
+    "CREATE INDEX IF NOT EXISTS idx_detections_image_threat "
+    "ON detections(image_filename, threat_level)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_ts    ON detections(timestamp)",
+)
+
+INSERT_SQL = (
+    f"INSERT INTO detections ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+
+_local     = threading.local()
+_init_lock = threading.Lock()
+_initialised = False
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, creating the database on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        _ensure_schema()
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    # isolation_level=None: autocommit; writers open explicit transactions
+    conn = sqlite3.connect(LOG_DB_PATH, isolation_level=None, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _ensure_schema():
+    global _initialised
+    if _initialised:
+        return
+    with _init_lock:
+        if _initialised:
+            return
+        os.makedirs(os.path.dirname(LOG_DB_PATH), exist_ok=True)
+        conn = _connect()
+        try:
+            conn.execute(_SCHEMA)
+            for statement in _INDEXES:
+                conn.execute(statement)
+            if conn.execute("SELECT 1 FROM detections LIMIT 1").fetchone() is None:
+                _import_legacy_csv(conn)
+        finally:
+            conn.close()
+        _initialised = True
+
+
+def _import_legacy_csv(conn: sqlite3.Connection):
+    """Copy rows from the pre-SQLite CSV log into an empty table."""
+    if not os.path.exists(LOG_PATH) or os.path.getsize(LOG_PATH) == 0:
+        return
+    try:
+        with open(LOG_PATH, "r", newline="", encoding="utf-8") as f:
+            rows = [
+                tuple(row.get(name) for name in COLUMNS)
+                for row in csv.DictReader(f)
+            ]
+        conn.execute("BEGIN")
+        conn.executemany(INSERT_SQL, rows)
+        conn.execute("COMMIT")
+        logger.info("Imported %d rows from %s", len(rows), LOG_PATH)
+    except (OSError, sqlite3.Error) as exc:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error("Failed to import legacy CSV log: %s", exc)
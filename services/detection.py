@@ -11,8 +11,11 @@ Design choices
 """
 
 import os
+import sys
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 import cv2
@@ -22,7 +25,7 @@ from config import (
     CONFIDENCE_THRESH, IOU_THRESH, MAX_DETECTIONS, DEVICE,
     HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES,
     COLOR_HIGH_RISK, COLOR_MEDIUM_RISK, COLOR_LOW_RISK,
-    UPLOAD_FOLDER,
+    UPLOAD_FOLDER, ANNOTATED_MAX_SIDE,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,9 +33,10 @@ logger = logging.getLogger(__name__)
 
 # ── Risk helper ───────────────────────────────────────────────────────────────
 
+@lru_cache(maxsize=None)   # risk sets are fixed per process; names are bounded
 def _risk_level(class_name: str) -> str:
     """Return 'high', 'medium', or 'low' for a given class name."""
-    name = class_name.lower().replace(" ", "_")
+    name = sys.intern(class_name.lower().replace(" ", "_"))
     if name in HIGH_RISK_CLASSES:
         return "high"
     if name in MEDIUM_RISK_CLASSES:
@@ -40,6 +44,36 @@ def _risk_level(class_name: str) -> str:
     return "low"
 
 
+RISK_LEVELS = np.array(["high", "medium", "low"])   # index == sort priority
+_RISK_CODE  = {risk: code for code, risk in enumerate(RISK_LEVELS.tolist())}
+
+
+def _risk_codes(class_names: np.ndarray) -> np.ndarray:
+    """Vectorised _risk_level: classify each distinct class once, then scatter."""
+    unique, inverse = np.unique(class_names, return_inverse=True)
+    codes = np.array([_RISK_CODE[_risk_level(n)] for n in unique.tolist()], dtype=np.int8)
+    return codes[inverse.reshape(-1)]
+
+
+_class_tables = (None, None, None)   # (names dict, id → name, id → risk code)
+
+
+def _class_luts(names: dict):
+    """
+    Lookup arrays indexed by class id: class name and risk code. Built once
+    per model ``names`` dict (the same object on every result), so per-image
+    classification is two fancy-indexing ops.
+    """
+    global _class_tables
+    if _class_tables[0] is not names:
+        n = max(names) + 1 if names else 0
+        name_lut = np.array([names.get(i, f"class_{i}") for i in range(n)])
+        risk_lut = np.array([_RISK_CODE[_risk_level(name)] for name in name_lut.tolist()],
+                            dtype=np.int8)
+        _class_tables = (names, name_lut, risk_lut)
+    return _class_tables[1], _class_tables[2]
+
+
 def _risk_color(risk: str):
     return {
         "high":   COLOR_HIGH_RISK,
@@ -84,6 +118,76 @@ def _annotate(image: np.ndarray, detections: list) -> np.ndarray:
     return annotated
 
 
+# Annotated JPEGs are drawn and encoded here so the batcher thread can start
+# the next model call; OpenCV releases the GIL while encoding.
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jpeg")
+
+
+def _write_annotated(image: np.ndarray, detections: list, path: str) -> None:
+    """Annotate *image* and write it to *path* as a JPEG in one write()."""
+    annotated = _annotate(image, detections)
+    # Large frames are only ever viewed scaled down; encode at display size.
+    # Boxes are drawn first so line and label sizes stay proportional.
+    long_side = max(annotated.shape[:2])
+    if 0 < ANNOTATED_MAX_SIDE < long_side:
+        scale = ANNOTATED_MAX_SIDE / long_side
+        annotated = cv2.resize(annotated, None, fx=scale, fy=scale,
+                               interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode(".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    if not ok:
+        raise ValueError(f"Could not encode annotated image: {path}")
+    with open(path, "wb") as f:
+        f.write(jpeg)
+
+
+# ── Model call ────────────────────────────────────────────────────────────────
+
+# Arguments for every predict() call; the warm-up in app.py uses the same ones
+# so the cached predictor is configured exactly as a regular call would be.
+PREDICT_KWARGS = {
+    "conf":    CONFIDENCE_THRESH,
+    "iou":     IOU_THRESH,
+    "max_det": MAX_DETECTIONS,
+    "device":  DEVICE,
+    "verbose": False,
+}
+
+_direct_predictor_ok = True
+
+
+def _predict(model, images: list, image_paths: list) -> list:
+    """
+    Run the model on decoded *images*.
+
+    After the first predict() call Ultralytics keeps a configured
+    ``model.predictor``; driving its preprocess/inference/postprocess steps
+    directly skips predict()'s per-call argument merging and source setup.
+    If that internal API doesn't match the installed Ultralytics version we
+    fall back to predict() for good.
+    """
+    global _direct_predictor_ok
+    predictor = getattr(model, "predictor", None)
+    if predictor is not None and _direct_predictor_ok:
+        try:
+            return _predict_direct(predictor, images, image_paths)
+        except (AttributeError, TypeError) as exc:
+            _direct_predictor_ok = False
+            logger.warning("Direct predictor path unavailable (%s) — using predict()", exc)
+
+    return model.predict(source=images, batch=len(images), **PREDICT_KWARGS)
+
+
+def _predict_direct(predictor, images: list, image_paths: list) -> list:
+    import torch
+
+    with torch.inference_mode():
+        # postprocess() reads result paths from the current batch
+        predictor.batch = (list(image_paths), images, [""] * len(images))
+        tensor = predictor.preprocess(images)
+        preds  = predictor.inference(tensor)
+        return predictor.postprocess(preds, tensor, images)
+
+
 # ── Main inference function ───────────────────────────────────────────────────
 
 def run_detection(model, image_path: str) -> dict:
@@ -99,69 +203,114 @@ def run_detection(model, image_path: str) -> dict:
     -------
     dict with keys:
         detections      – list of detection dicts
+        detections_soa  – the same detections as parallel NumPy arrays
+                          (id, cls, conf, risk, box), for vectorised consumers
         annotated_path  – URL-relative path to annotated image
+        annotated_ready – Future that resolves once that file is written
         inference_ms    – inference time in milliseconds
         image_size      – (width, height)
     """
-    # ── Load image ─────────────────────────────────────────────────────────────
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Could not read image: {image_path}")
+    return run_detection_batch(model, [image_path])[0]
 
-    h, w = image.shape[:2]
+
+def run_detection_batch(model, image_paths: list) -> list:
+    """
+    Run YOLO inference on several images in a single forward pass.
+
+    Returns one result dict per path (same shape as :func:`run_detection`),
+    in input order. ``inference_ms`` is the wall time of the shared batch.
+    """
+    # ── Load images ────────────────────────────────────────────────────────────
+    images = []
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        images.append(image)
 
     # ── Run YOLO ───────────────────────────────────────────────────────────────
     t0 = time.perf_counter()
-    results = model.predict(
-        source     = image_path,
-        conf       = CONFIDENCE_THRESH,
-        iou        = IOU_THRESH,
-        max_det    = MAX_DETECTIONS,
-        device     = DEVICE,
-        verbose    = False,
-    )
+    results = _predict(model, images, image_paths)  # already decoded — no second imread
     inference_ms = round((time.perf_counter() - t0) * 1000, 1)
 
-    # ── Parse results ──────────────────────────────────────────────────────────
-    detections = []
-    result = results[0]  # single image → single result
-
-    if result.boxes is not None:
-        boxes_xyxy = result.boxes.xyxy.cpu().numpy()   # shape (N,4)
-        confs      = result.boxes.conf.cpu().numpy()   # shape (N,)
-        cls_ids    = result.boxes.cls.cpu().numpy().astype(int)  # shape (N,)
-        names      = result.names                      # {id: class_name}
-
-        for i, (box, conf, cls_id) in enumerate(zip(boxes_xyxy, confs, cls_ids)):
-            x1, y1, x2, y2 = [int(v) for v in box]
-            class_name = names.get(cls_id, f"class_{cls_id}")
-            risk       = _risk_level(class_name)
-
-            detections.append({
-                "id":         i,
-                "class_name": class_name,
-                "confidence": float(round(conf, 4)),
-                "risk_level": risk,
-                "box": {
-                    "x1": x1, "y1": y1,
-                    "x2": x2, "y2": y2,
-                    "width":  x2 - x1,
-                    "height": y2 - y1,
-                    "cx":     (x1 + x2) // 2,
-                    "cy":     (y1 + y2) // 2,
-                },
-            })
-
-    # Sort: high-risk first, then by confidence descending
-    _priority = {"high": 0, "medium": 1, "low": 2}
-    detections.sort(key=lambda d: (_priority[d["risk_level"]], -d["confidence"]))
-
-    # ── Annotate & save ────────────────────────────────────────────────────────
-    annotated_img   = _annotate(image, detections)
+    return [
+        _postprocess(result, image, image_path, inference_ms)
+        for result, image, image_path in zip(results, images, image_paths)
+    ]
+
+
+def _parse_boxes(result) -> dict:
+    """
+    Convert one Ultralytics result into parallel arrays, sorted high-risk
+    first and then by confidence descending. ``id`` is the original index.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return {
+            "id":   np.empty(0, dtype=np.int64),
+            "cls":  np.empty(0, dtype=str),
+            "conf": np.empty(0, dtype=np.float32),
+            "risk": np.empty(0, dtype=RISK_LEVELS.dtype),
+            "box":  np.empty((0, 4), dtype=np.int64),
+        }
+
+    boxes_xyxy = boxes.xyxy.cpu().numpy().astype(np.int64)           # shape (N,4)
+    confs      = np.round(boxes.conf.cpu().numpy(), 4)                # shape (N,)
+    cls_ids    = boxes.cls.cpu().numpy().astype(int)                  # shape (N,)
+    names      = result.names                                         # {id: class_name}
+
+    name_lut, risk_lut = _class_luts(names)
+    if cls_ids.max() < len(name_lut):
+        class_names = name_lut[cls_ids]
+        risk_codes  = risk_lut[cls_ids]
+    else:  # ids outside model.names: classify per image
+        class_names = np.array([names.get(c, f"class_{c}") for c in cls_ids.tolist()])
+        risk_codes  = _risk_codes(class_names)
+
+    # Sort: high-risk first, then by confidence descending (stable)
+    order = np.lexsort((-confs, risk_codes))
+
+    return {
+        "id":   order,
+        "cls":  class_names[order],
+        "conf": confs[order],
+        "risk": RISK_LEVELS[risk_codes[order]],
+        "box":  boxes_xyxy[order],
+    }
+
+
+def _postprocess(result, image: np.ndarray, image_path: str, inference_ms: float) -> dict:
+    """Parse one Ultralytics result, annotate the image and save it."""
+    h, w = image.shape[:2]
+
+    # ── Parse results (struct-of-arrays) ──────────────────────────────────────
+    soa = _parse_boxes(result)
+    detections = [
+        {
+            "id":         det_id,
+            "class_name": class_name,
+            "confidence": conf,
+            "risk_level": risk,
+            "box": {
+                "x1": x1, "y1": y1,
+                "x2": x2, "y2": y2,
+                "width":  x2 - x1,
+                "height": y2 - y1,
+                "cx":     (x1 + x2) // 2,
+                "cy":     (y1 + y2) // 2,
+            },
+        }
+        for det_id, class_name, conf, risk, (x1, y1, x2, y2) in zip(
+            soa["id"].tolist(), soa["cls"].tolist(), soa["conf"].tolist(),
+            soa["risk"].tolist(), soa["box"].tolist(),
+        )
+    ]
+
+    # ── Annotate & save (in the background) ────────────────────────────────────
     orig_stem       = Path(image_path).stem
     annotated_name  = f"annotated_{orig_stem}.jpg"
     annotated_path  = os.path.join(UPLOAD_FOLDER, annotated_name)
-    cv2.imwrite(annotated_path, annotated_img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    annotated_ready = _ENCODE_POOL.submit(_write_annotated, image, detections, annotated_path)
 
     # URL path (relative to /static/)
     annotated_url = f"/static/uploads/{annotated_name}"
@@ -173,7 +322,9 @@ def run_detection(model, image_path: str) -> dict:
 
     return {
         "detections":     detections,
+        "detections_soa": soa,
         "annotated_path": annotated_url,
+        "annotated_ready": annotated_ready,
         "inference_ms":   inference_ms,
         "image_size":     {"width": w, "height": h},
     }
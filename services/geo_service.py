@@ -2,19 +2,57 @@
 services/geo_service.py
 Extract GPS coordinates from image EXIF data and reverse geocode to location name.
 """
+import os
+import struct
 import logging
 from PIL import Image
+from functools import lru_cache
 from PIL.ExifTags import TAGS, GPSTAGS
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
 log = logging.getLogger(__name__)
 
+_GPS_IFD = 0x8825
+
+
+def _read_jpeg_exif(image_path):
+    """
+    Return the raw Exif APP1 payload of a JPEG by walking its marker segments
+    (pixel data is never read). Returns b'' for a JPEG without Exif and None
+    when the file is not a JPEG.
+    """
+    with open(image_path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            marker = f.read(4)
+            if len(marker) < 4 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+                return b''  # truncated, EOI or start of scan: no Exif segment
+            length = struct.unpack('>H', marker[2:])[0] - 2
+            if marker[1] == 0xE1:
+                payload = f.read(length)
+                if payload.startswith(b'Exif\x00\x00'):
+                    return payload
+            else:
+                f.seek(length, os.SEEK_CUR)
+
+
 def _get_exif(image_path):
     """Extract EXIF data from image."""
     try:
-        img = Image.open(image_path)
-        exif_data = img._getexif()
+        raw = _read_jpeg_exif(image_path)
+        if raw == b'':
+            return None
+        if raw is not None:
+            parsed = Image.Exif()
+            parsed.load(raw)
+            exif_data = dict(parsed)
+            gps_ifd = parsed.get_ifd(_GPS_IFD)
+            exif_data.pop(_GPS_IFD, None)
+            if gps_ifd:
+                exif_data[_GPS_IFD] = dict(gps_ifd)
+        else:
+            img = Image.open(image_path)
+            exif_data = img._getexif()
         if not exif_data:
             return None
         exif = {}
@@ -63,29 +101,40 @@ def _get_lat_lon(gps_info):
         log.debug(f'Could not extract lat/lon: {e}')
         return None, None
 
+@lru_cache(maxsize=1)
+def _geolocator():
+    """Build the Nominatim client once; geopy is imported on first GPS upload."""
+    import ssl
+    import certifi
+    from geopy.geocoders import Nominatim
+
+    # Create SSL context with certifi certificates
+    ctx = ssl.create_default_context(cafile=certifi.where())
+    return Nominatim(
+        user_agent='aegis_geo_intel_v2',
+        ssl_context=ctx
+    )
+
+@lru_cache(maxsize=4096)
+def _reverse_geocode_cached(lat_r, lon_r):
+    """Nominatim lookup for a rounded coordinate; errors propagate uncached."""
+    geolocator = _geolocator()
+    location = geolocator.reverse((lat_r, lon_r), timeout=5, language='en')
+    
+    if location and location.raw.get('address'):
+        addr = location.raw['address']
+        parts = []
+        for key in ['city', 'town', 'village', 'county', 'state', 'country']:
+            if key in addr and addr[key] not in parts:
+                parts.append(addr[key])
+        return ', '.join(parts[:3]) if parts else location.address
+    return None
+
 def _reverse_geocode(lat, lon):
     """Get location name from coordinates using Nominatim (free)."""
     try:
-        import ssl
-        import certifi
-        from geopy.geocoders import Nominatim
-        
-        # Create SSL context with certifi certificates
-        ctx = ssl.create_default_context(cafile=certifi.where())
-        geolocator = Nominatim(
-            user_agent='aegis_geo_intel_v2',
-            ssl_context=ctx
-        )
-        location = geolocator.reverse((lat, lon), timeout=5, language='en')
-        
-        if location and location.raw.get('address'):
-            addr = location.raw['address']
-            parts = []
-            for key in ['city', 'town', 'village', 'county', 'state', 'country']:
-                if key in addr and addr[key] not in parts:
-                    parts.append(addr[key])
-            return ', '.join(parts[:3]) if parts else location.address
-        return None
+        # 3 decimals (~110 m): photos from the same spot share one lookup
+        return _reverse_geocode_cached(round(lat, 3), round(lon, 3))
     except Exception as e:
         log.warning(f'Geocoding failed: {e}')
         # Always return coordinates as fallback - never return None
@@ -7,7 +7,8 @@ Supports: OpenRouter, Groq, Gemini, Anthropic, OpenAI
 """
 
 import logging
-from typing import List, Dict, Optional
+import threading
+from typing import Dict, Iterator, List, Optional
 
 import config
 
@@ -23,6 +24,10 @@ class LLMClient:
         self.max_tokens = config.LLM_MAX_TOKENS
         self.temperature = config.LLM_TEMPERATURE
         self._client = None
+        # SITREPs run on a thread pool and chat on request threads; the
+        # provider SDK clients are thread-safe and share one connection
+        # pool, so the only limit needed is on concurrent calls.
+        self._slots = threading.BoundedSemaphore(max(1, config.LLM_MAX_CONCURRENT))
         self._initialize_client()
     
     def _initialize_client(self):
@@ -52,6 +57,8 @@ class LLMClient:
             elif self.provider == "gemini":
                 import google.generativeai as genai
                 genai.configure(api_key=config.GEMINI_API_KEY)
+                # Models are bound per call to that call's system instruction
+                self._genai = genai
                 self._client = genai.GenerativeModel(self.model)
                 
             else:
@@ -80,18 +87,75 @@ class LLMClient:
             Dict with keys: text, tokens_used, model
         """
         try:
+            with self._slots:
+                return self._dispatch(system_prompt, user_message, messages)
+        except Exception as e:
+            logger.error(f"LLM generation error: {e}")
+            raise
+    
+    def _dispatch(self, system_prompt: str, user_message: str,
+                  messages: Optional[List[Dict]] = None) -> Dict:
+        """Route the call to the configured provider."""
+        if self.provider == "anthropic":
+            return self._generate_anthropic(system_prompt, user_message, messages)
+        elif self.provider in ["openai", "groq", "openrouter"]:
+            return self._generate_openai_compatible(system_prompt, user_message, messages)
+        elif self.provider == "gemini":
+            return self._generate_gemini(system_prompt, user_message, messages)
+        else:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+    
+    def stream(self, system_prompt: str, user_message: str,
+               messages: Optional[List[Dict]] = None) -> Iterator[str]:
+        """
+        Like generate(), but yield the response text in chunks as the
+        provider produces them. Holds a concurrency slot until exhausted.
+        """
+        with self._slots:
             if self.provider == "anthropic":
-                return self._generate_anthropic(system_prompt, user_message, messages)
+                msg_list = list(messages or [])
+                msg_list.append({"role": "user", "content": user_message})
+                with self._client.messages.stream(
+                    model=self.model,
+                    max_tokens=self.max_tokens,
+                    system=system_prompt,
+                    messages=msg_list
+                ) as stream:
+                    yield from stream.text_stream
+            
             elif self.provider in ["openai", "groq", "openrouter"]:
-                return self._generate_openai_compatible(system_prompt, user_message, messages)
+                msg_list = [{"role": "system", "content": system_prompt}]
+                if messages:
+                    msg_list.extend(messages)
+                msg_list.append({"role": "user", "content": user_message})
+                
+                response = self._client.chat.completions.create(
+                    model=self.model,
+                    messages=msg_list,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    stream=True
+                )
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            
             elif self.provider == "gemini":
-                return self._generate_gemini(system_prompt, user_message, messages)
+                model, contents = self._gemini_request(system_prompt, user_message, messages)
+                response = model.generate_content(
+                    contents,
+                    generation_config={
+                        "max_output_tokens": self.max_tokens,
+                        "temperature": self.temperature
+                    },
+                    stream=True
+                )
+                for chunk in response:
+                    if chunk.parts:   # .text raises on an empty (e.g. final) chunk
+                        yield chunk.text
+            
             else:
                 raise ValueError(f"Unsupported provider: {self.provider}")
-                
-        except Exception as e:
-            logger.error(f"LLM generation error: {e}")
-            raise
     
     def _generate_anthropic(self, system_prompt: str, user_message: str,
                            messages: Optional[List[Dict]] = None) -> Dict:
@@ -139,34 +203,47 @@ class LLMClient:
             "model": self.model
         }
     
+    def _gemini_request(self, system_prompt: str, user_message: str,
+                        messages: Optional[List[Dict]] = None):
+        """
+        Return a model bound to *system_prompt* and the conversation as
+        structured turns (Gemini names the assistant role "model"), so the
+        history is not re-flattened into one prompt string on every call.
+        """
+        model = self._genai.GenerativeModel(self.model, system_instruction=system_prompt)
+        contents = [
+            {"role": "model" if msg["role"] == "assistant" else "user",
+             "parts": [msg["content"]]}
+            for msg in messages or []
+        ]
+        contents.append({"role": "user", "parts": [user_message]})
+        return model, contents
+    
     def _generate_gemini(self, system_prompt: str, user_message: str,
                         messages: Optional[List[Dict]] = None) -> Dict:
         """Generate using Google Gemini API."""
-        # Gemini combines system prompt with user message
-        full_prompt = f"{system_prompt}\n\n{user_message}"
-        
-        if messages:
-            # Build conversation history
-            history_text = "\n".join([
-                f"{msg['role'].upper()}: {msg['content']}"
-                for msg in messages
-            ])
-            full_prompt = f"{system_prompt}\n\nCONVERSATION HISTORY:\n{history_text}\n\nCURRENT MESSAGE:\n{user_message}"
+        model, contents = self._gemini_request(system_prompt, user_message, messages)
         
         try:
-            response = self._client.generate_content(
-                full_prompt,
+            response = model.generate_content(
+                contents,
                 generation_config={
                     "max_output_tokens": self.max_tokens,
                     "temperature": self.temperature
                 }
             )
             
-            # Gemini doesn't provide token counts in free tier
-            tokens_used = len(full_prompt.split()) + len(response.text.split())
+            text = response.text
+            usage = getattr(response, "usage_metadata", None)
+            tokens_used = getattr(usage, "total_token_count", 0)
+            if not tokens_used:
+                # No usage metadata (older SDKs): estimate from word counts
+                tokens_used = len(system_prompt.split()) + len(text.split()) + sum(
+                    len(turn["parts"][0].split()) for turn in contents
+                )
             
             return {
-                "text": response.text,
+                "text": text,
                 "tokens_used": tokens_used,
                 "model": self.model
             }
@@ -175,16 +252,20 @@ class LLMClient:
             # Try to extract error details
             error_msg = str(e)
             if "not found" in error_msg.lower():
-                logger.error(f"Model '{self.model}' not found. Try: gemini-1.5-flash-latest, gemini-1.5-pro-latest, or gemini-pro")
+                logger.error(f"Model '{self.model}' not found. Try: gemini-1.5-flash-latest or gemini-1.5-pro-latest (system instructions need Gemini 1.5+)")
             raise
 
 
-# Global client instance
+# Global client instance: one SDK client means one pooled, keep-alive HTTP
+# connection set (and one concurrency limit) shared by every thread
 _client = None
+_client_lock = threading.Lock()
 
 def get_llm_client() -> LLMClient:
     """Get or create the global LLM client instance."""
     global _client
     if _client is None:
-        _client = LLMClient()
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
     return _client
@@ -1,49 +1,27 @@
 """
 services/logger.py
 ------------------
-Append detection events to a persistent CSV log file.
+Record detection events in the SQLite detection log (see services/db.py).
 
-CSV columns
------------
+Columns
+-------
 timestamp, image_filename, threat_level, total_detections,
 high_risk_count, class_name, confidence, risk_level,
 box_x1, box_y1, box_x2, box_y2, inference_ms
 """
 
 import csv
-import os
+import io
 import logging
+import sqlite3
 from datetime import datetime
 
-from config import LOG_PATH
+from services.db import COLUMNS, INSERT_SQL, get_connection
 
 _file_logger = logging.getLogger(__name__)
 
-# CSV column headers (written once when the file is first created)
-CSV_HEADERS = [
-    "timestamp",
-    "image_filename",
-    "threat_level",
-    "total_detections",
-    "high_risk_count",
-    "class_name",
-    "confidence",
-    "risk_level",
-    "box_x1",
-    "box_y1",
-    "box_x2",
-    "box_y2",
-    "inference_ms",
-]
-
-
-def _ensure_log_file():
-    """Create the CSV file with headers if it does not already exist."""
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    if not os.path.exists(LOG_PATH) or os.path.getsize(LOG_PATH) == 0:
-        with open(LOG_PATH, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(CSV_HEADERS)
+# CSV column headers (used by /api/export-csv)
+CSV_HEADERS = list(COLUMNS)
 
 
 def log_detections(
@@ -53,7 +31,8 @@ def log_detections(
     inference_ms: float,
 ) -> None:
     """
-    Append one row per detection (or a single 'no-detection' row) to the CSV.
+    Insert one row per detection (or a single 'no-detection' row) in a
+    single transaction.
 
     Parameters
     ----------
@@ -62,8 +41,6 @@ def log_detections(
     threat_report  : dict from alert.check_threat()
     inference_ms   : inference duration in milliseconds
     """
-    _ensure_log_file()
-
     timestamp     = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
     threat_level  = threat_report["threat_level"]
     total         = threat_report["stats"]["total"]
@@ -80,7 +57,7 @@ def log_detections(
                 total,
                 high_risk_cnt,
                 det["class_name"],
-                f"{det['confidence']:.4f}",
+                round(det["confidence"], 4),
                 det["risk_level"],
                 det["box"]["x1"],
                 det["box"]["y1"],
@@ -95,32 +72,50 @@ def log_detections(
             image_filename,
             threat_level,
             0, 0,
-            "NONE", "0.0000", "none",
+            "NONE", 0.0, "none",
             0, 0, 0, 0,
             inference_ms,
         ])
 
+    conn = get_connection()
     try:
-        with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerows(rows)
+        conn.execute("BEGIN")
+        conn.executemany(INSERT_SQL, rows)
+        conn.execute("COMMIT")
         _file_logger.info("Logged %d detection rows for %s", len(rows), image_filename)
-    except OSError as exc:
+    except sqlite3.Error as exc:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
         _file_logger.error("Failed to write detection log: %s", exc)
 
 
 def get_recent_logs(limit: int = 50) -> list[dict]:
     """
-    Read the most recent *limit* rows from the CSV and return as list of dicts.
+    Return the most recent *limit* rows (oldest first) as a list of dicts.
     Used by the /logs API endpoint.
     """
-    _ensure_log_file()
-    rows = []
-    try:
-        with open(LOG_PATH, "r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                rows.append(row)
-    except OSError:
-        pass
-    return rows[-limit:]  # return tail
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(COLUMNS)} FROM detections ORDER BY id DESC LIMIT ?",
+        (limit,),
+    )
+    return [dict(row) for row in reversed(cursor.fetchall())]
+
+
+def iter_csv(batch_size: int = 1000):
+    """
+    Yield the full detection log as CSV text, *batch_size* rows per chunk,
+    so exports use constant memory regardless of history length.
+    """
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(COLUMNS)} FROM detections ORDER BY id"
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADERS)
+    while batch := cursor.fetchmany(batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only: the log is empty
+        yield buffer.getvalue()
@@ -3,24 +3,46 @@ services/sitrep_store.py
 ------------------------
 Persistent storage for SITREPs, detection contexts, and chat histories.
 
-Stores data in a JSON file to survive server restarts.
+The store lives in memory and is persisted as an append-only JSON-lines
+journal: every mutation appends one record, and the journal is replayed on
+startup. When the journal grows past SITREP_JOURNAL_MAX_MB (and to at least
+twice the size of the last snapshot) it is compacted into a snapshot of the
+live data.
 """
 
+import heapq
 import json
 import logging
+import os
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime
 
 import config
 
+try:
+    import orjson
+except ImportError:  # optional — fall back to the stdlib json module
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+# Journal records are compact JSON bytes; orjson (C) is used when installed
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(record: Dict) -> bytes:
+        return json.dumps(record, separators=(",", ":")).encode("utf-8")
+    _loads = json.loads
+
+
 class SitrepStore:
     """
     Manages persistent storage of SITREPs and chat histories.
-    
+
     Data structure:
     {
         "scan_id": {
@@ -35,40 +57,110 @@ class SitrepStore:
             ]
         }
     }
+
+    Journal records (one JSON object per line):
+        {"op": "save",   "scan_id": ..., "entry": {...}}
+        {"op": "chat",   "scan_id": ..., "role": ..., "content": ...}
+        {"op": "delete", "scan_ids": [...]}
     """
-    
-    def __init__(self, store_path: str = None):
+
+    def __init__(self, store_path: str = None, max_journal_mb: float = None):
         self.store_path = Path(store_path or config.SITREP_STORE_PATH)
         self.store_path.parent.mkdir(parents=True, exist_ok=True)
-        self._ensure_store_exists()
-    
-    def _ensure_store_exists(self):
-        """Create store file if it doesn't exist."""
-        if not self.store_path.exists():
-            self._write_store({})
-    
+        self.max_journal_bytes = int(
+            (max_journal_mb or config.SITREP_JOURNAL_MAX_MB) * 1024 * 1024
+        )
+        # Guards the in-memory dict and the journal file; SITREPs are saved
+        # from background threads while chat requests append messages.
+        self._lock = threading.RLock()
+        # Size of the last snapshot written; compaction waits until the
+        # journal has at least doubled it, so a live set larger than the
+        # limit isn't rewritten on every append.
+        self._snapshot_bytes = 0
+        self._store = self._read_store()
+
     def _read_store(self) -> Dict:
-        """Read entire store from disk."""
+        """Rebuild the store by replaying the journal (or a legacy JSON file)."""
+        if not self.store_path.exists():
+            return self._migrate_legacy_store()
+
+        store = {}
+        with open(self.store_path, 'rb') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    self._apply(store, _loads(line))
+                except (ValueError, KeyError, TypeError):  # incl. JSON and UTF-8 decode errors
+                    # A torn final line after a crash is expected; skip it
+                    logger.warning(f"Skipping corrupt journal line {line_no}")
+        return store
+
+    def _migrate_legacy_store(self) -> Dict:
+        """Import the pre-journal sitreps.json snapshot, if one exists."""
+        legacy_path = self.store_path.with_suffix(".json")
+        store = {}
+        if legacy_path.exists():
+            try:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    store = json.load(f)
+                logger.info(f"Migrated {len(store)} scans from {legacy_path}")
+            except (json.JSONDecodeError, OSError):
+                logger.warning(f"Could not read legacy store {legacy_path}, initializing empty")
+        self._write_store(store)
+        return store
+
+    @staticmethod
+    def _apply(store: Dict, record: Dict):
+        """Apply one journal record to *store*."""
+        op = record["op"]
+        if op == "save":
+            store[record["scan_id"]] = record["entry"]
+        elif op == "chat":
+            scan = store.get(record["scan_id"])
+            if scan is not None:
+                scan["chat_history"].append({
+                    "role": record["role"],
+                    "content": record["content"]
+                })
+        elif op == "delete":
+            for scan_id in record["scan_ids"]:
+                store.pop(scan_id, None)
+
+    def _append(self, record: Dict):
+        """Append one record to the journal, compacting it when too large."""
         try:
-            with open(self.store_path, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            logger.warning(f"Could not read store, initializing empty")
-            return {}
-    
+            with open(self.store_path, 'ab') as f:
+                f.write(_dumps(record) + b"\n")
+                size = f.tell()
+        except OSError as e:
+            logger.error(f"Failed to append to store journal: {e}")
+            return
+        if size > max(self.max_journal_bytes, 2 * self._snapshot_bytes):
+            self._write_store(self._store)
+
     def _write_store(self, data: Dict):
-        """Write entire store to disk."""
+        """Rewrite the journal as a compact snapshot of *data*."""
+        tmp_path = self.store_path.with_suffix(".tmp")
         try:
-            with open(self.store_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(tmp_path, 'wb') as f:
+                for scan_id, entry in data.items():
+                    f.write(_dumps({"op": "save", "scan_id": scan_id, "entry": entry}) + b"\n")
+                # The snapshot must be on disk before it replaces the journal,
+                # or a crash right after the rename can leave an empty store
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            tmp_path.replace(self.store_path)
+            self._snapshot_bytes = size
         except Exception as e:
             logger.error(f"Failed to write store: {e}")
-    
-    def save_sitrep(self, scan_id: str, detection_context: str, 
+
+    def save_sitrep(self, scan_id: str, detection_context: str,
                     sitrep: str, model: str, tokens: int):
         """
         Save a SITREP for a scan.
-        
+
         Args:
             scan_id: Unique scan identifier
             detection_context: Full detection context string
@@ -76,9 +168,7 @@ class SitrepStore:
             model: Claude model used
             tokens: Total tokens used
         """
-        store = self._read_store()
-        
-        store[scan_id] = {
+        entry = {
             "timestamp": datetime.utcnow().isoformat(),
             "detection_context": detection_context,
             "sitrep": sitrep,
@@ -86,92 +176,101 @@ class SitrepStore:
             "tokens": tokens,
             "chat_history": []
         }
-        
-        self._write_store(store)
+
+        with self._lock:
+            self._store[scan_id] = entry
+            self._append({"op": "save", "scan_id": scan_id, "entry": entry})
         logger.info(f"Saved SITREP for scan {scan_id}")
-    
+
     def get_sitrep(self, scan_id: str) -> Optional[Dict]:
         """
         Retrieve a SITREP by scan ID.
-        
+
         Args:
             scan_id: Unique scan identifier
-            
+
         Returns:
             Dict with SITREP data or None if not found
         """
-        store = self._read_store()
-        return store.get(scan_id)
-    
+        with self._lock:
+            scan_data = self._store.get(scan_id)
+            if scan_data is None:
+                return None
+            # Copy so callers can't mutate the live store
+            return {**scan_data, "chat_history": list(scan_data["chat_history"])}
+
     def add_chat_message(self, scan_id: str, role: str, content: str):
         """
         Add a message to the chat history for a scan.
-        
+
         Args:
             scan_id: Unique scan identifier
             role: "user" or "assistant"
             content: Message content
         """
-        store = self._read_store()
-        
-        if scan_id not in store:
-            logger.warning(f"Scan {scan_id} not found, cannot add chat message")
-            return
-        
-        store[scan_id]["chat_history"].append({
-            "role": role,
-            "content": content
-        })
-        
-        self._write_store(store)
+        with self._lock:
+            if scan_id not in self._store:
+                logger.warning(f"Scan {scan_id} not found, cannot add chat message")
+                return
+
+            record = {"op": "chat", "scan_id": scan_id, "role": role, "content": content}
+            self._apply(self._store, record)
+            self._append(record)
         logger.debug(f"Added {role} message to scan {scan_id}")
-    
+
     def get_chat_history(self, scan_id: str) -> List[Dict]:
         """
         Get chat history for a scan.
-        
+
         Args:
             scan_id: Unique scan identifier
-            
+
         Returns:
             List of chat messages or empty list if not found
         """
-        store = self._read_store()
-        scan_data = store.get(scan_id, {})
-        return scan_data.get("chat_history", [])
-    
+        with self._lock:
+            scan_data = self._store.get(scan_id, {})
+            return list(scan_data.get("chat_history", []))
+
     def cleanup_old_scans(self, keep_last_n: int = 100):
         """
         Remove old scans to prevent unbounded growth.
-        
+
         Args:
             keep_last_n: Number of most recent scans to keep
         """
-        store = self._read_store()
-        
-        if len(store) <= keep_last_n:
-            return
-        
-        # Sort by timestamp, keep most recent
-        sorted_scans = sorted(
-            store.items(),
-            key=lambda x: x[1].get("timestamp", ""),
-            reverse=True
-        )
-        
-        new_store = dict(sorted_scans[:keep_last_n])
-        self._write_store(new_store)
-        
-        removed = len(store) - len(new_store)
-        logger.info(f"Cleaned up {removed} old scans, kept {len(new_store)}")
+        with self._lock:
+            if len(self._store) <= keep_last_n:
+                return
+
+            # Keep the most recent by (ISO, so sortable) timestamp; a bounded
+            # heap avoids sorting the whole store
+            keep = {
+                scan_id for scan_id, _ in heapq.nlargest(
+                    keep_last_n,
+                    self._store.items(),
+                    key=lambda x: x[1].get("timestamp", "")
+                )
+            }
+
+            stale = [scan_id for scan_id in self._store if scan_id not in keep]
+            record = {"op": "delete", "scan_ids": stale}
+            self._apply(self._store, record)
+            self._append(record)
+            removed = len(stale)
+
+        logger.info(f"Cleaned up {removed} old scans, kept {keep_last_n}")
 
 
 # Global store instance
 _store = None
+_store_lock = threading.Lock()
 
 def get_store() -> SitrepStore:
     """Get or create the global SitrepStore instance."""
     global _store
     if _store is None:
-        _store = SitrepStore()
+        with _store_lock:
+            if _store is None:
+                _store = SitrepStore()
     return _store
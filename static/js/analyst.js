@@ -57,19 +57,36 @@ function renderAnalyst(data) {
 }
 
 /* ── Fetch SITREP ────────────────────────────────────────────────── */
+// SITREPs are generated in the background after /detect returns;
+// the endpoint answers 202 while generation is still pending.
+const SITREP_POLL_MS = 1000;
+const SITREP_MAX_POLLS = 90;
+
 async function fetchSitrep(scanId) {
   try {
-    const response = await fetch(`/api/sitrep/${scanId}`);
-    const data = await response.json();
-    
-    if (!response.ok || !data.success) {
-      throw new Error(data.error || "Failed to fetch SITREP");
+    let data;
+    for (let attempt = 0; ; attempt++) {
+      const response = await fetch(`/api/sitrep/${scanId}`);
+      data = await response.json();
+
+      // A newer scan replaced this one while we were waiting
+      if (scanId !== currentScanId) return;
+
+      if (response.status === 202 && attempt < SITREP_MAX_POLLS) {
+        await new Promise((resolve) => setTimeout(resolve, SITREP_POLL_MS));
+        continue;
+      }
+      if (!response.ok || !data.success) {
+        throw new Error(data.error || "Failed to fetch SITREP");
+      }
+      break;
     }
     
     displaySitrep(data.sitrep);
     
   } catch (err) {
     console.error("SITREP fetch error:", err);
+    if (scanId !== currentScanId) return;
     analystSitrep.innerHTML = `
       <div class="analyst-empty">
         <div class="analyst-empty__icon">⚠</div>
@@ -153,7 +170,8 @@ async function sendMessage() {
   sendChatBtn.disabled = true;
   
   try {
-    const response = await fetch("/api/chat", {
+    // Answer is streamed as Server-Sent Events while the model generates it
+    const response = await fetch("/api/chat/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
@@ -162,17 +180,42 @@ async function sendMessage() {
       })
     });
     
-    const data = await response.json();
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || "Chat request failed");
+    }
     
-    // Remove loading indicator
-    removeChatMessage(loadingId);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let answerDiv = null;
     
-    if (!response.ok || !data.success) {
-      throw new Error(data.error || "Chat request failed");
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      
+      // Events are separated by a blank line; keep any partial event
+      const events = buffered.split("\n\n");
+      buffered = events.pop();
+      
+      for (const event of events) {
+        if (!event.startsWith("data: ")) continue;
+        const data = JSON.parse(event.slice(6));
+        if (data.error) throw new Error(data.error);
+        if (data.delta === undefined) continue;
+        
+        // Swap the loading indicator for the answer on the first chunk
+        if (!answerDiv) {
+          removeChatMessage(loadingId);
+          answerDiv = document.getElementById(addChatMessage("", "analyst"));
+        }
+        answerDiv.textContent += data.delta;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+      }
     }
     
-    // Add analyst response (backend returns "answer" not "response")
-    addChatMessage(data.answer, "analyst");
+    removeChatMessage(loadingId);
     
   } catch (err) {
     console.error("Chat error:", err);
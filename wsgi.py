@@ -0,0 +1,15 @@
+"""
+wsgi.py
+-------
+WSGI entry point for production servers.
+
+The model is loaded when ``app`` is imported, so run a single worker and let
+threads provide concurrency — extra workers would each load their own copy
+of the model into GPU memory:
+
+    gunicorn -w 1 --threads 8 -k gthread -b 0.0.0.0:5000 --timeout 120 wsgi:application
+
+See run.sh.
+"""
+
+from app import app as application  # noqa: F401